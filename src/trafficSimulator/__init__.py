@@ -1,13 +1,38 @@
-from .core.geometry.segment import Segment
-from .core.geometry.quadratic_curve import QuadraticCurve
-from .core.geometry.cubic_curve import CubicCurve
-
-from .core.vehicle import Vehicle
-from .core.vehicle_generator import VehicleGenerator
-
-from .core.simulation import Simulation
-from .visualizer.window import Window
-from .core.static_object import StaticObject
-from .core.config_loader import ConfigLoader
-from .core.obstacle import Obstacle
-from .core.traffic_light import TrafficLight
\ No newline at end of file
+"""Microscopic traffic simulation.
+
+Le classi pubbliche vengono importate solo al primo accesso (PEP 562): `import
+trafficSimulator` resta economico per i processi headless di breve durata, e il
+visualizzatore (dearpygui) viene caricato solo se si usa `Window`.
+"""
+from importlib import import_module
+
+# {nome pubblico: modulo che lo definisce}
+_EXPORTS = {
+    "Segment": ".core.geometry.segment",
+    "QuadraticCurve": ".core.geometry.quadratic_curve",
+    "CubicCurve": ".core.geometry.cubic_curve",
+
+    "Vehicle": ".core.vehicle",
+    "VehicleGenerator": ".core.vehicle_generator",
+
+    "Simulation": ".core.simulation",
+    "Window": ".visualizer.window",
+    "StaticObject": ".core.static_object",
+    "ConfigLoader": ".core.config_loader",
+    "Obstacle": ".core.obstacle",
+    "TrafficLight": ".core.traffic_light",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # gli accessi successivi non passano più di qui
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
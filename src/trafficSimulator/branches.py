@@ -0,0 +1,124 @@
+"""Diramazioni di una simulazione già avviata, eseguite in parallelo.
+
+    from trafficSimulator.branches import run_branches
+
+    sim.run(108000)                               # riscaldamento comune
+    def plan(cycle):
+        def setup(branch):
+            for tl in branch.traffic_lights:
+                branch.set_cycle_time(tl, cycle)
+        return setup
+    rows = run_branches(sim, [plan(20), plan(30), plan(45)], steps=36000)
+
+Ogni diramazione gira in un processo figlio creato con os.fork: il figlio parte con una
+copia copy-on-write dell'intero processo, quindi la rete non viene né copiata né
+serializzata e lo stato iniziale (compreso il generatore casuale) è identico per tutti.
+Dove os.fork non esiste (Windows) le diramazioni girano una dopo l'altra con Simulation.fork.
+In entrambi i casi le diramazioni non hanno registratore, statistiche né on_trip_end.
+"""
+import os
+import pickle
+import time
+import traceback
+
+import numpy as np
+
+from .runner import summarize
+
+
+def _run_branch(sim, index, setup, steps, collect):
+    if setup is not None:
+        setup(sim)
+    start = time.perf_counter()
+    sim.run(steps)
+    wall_time = time.perf_counter() - start
+    row = {"branch": index}
+    row.update(summarize(sim, wall_time))
+    if collect is not None:
+        row["result"] = collect(sim)
+    return row
+
+
+def _read_all(fd):
+    chunks = []
+    while True:
+        data = os.read(fd, 1 << 16)
+        if not data:
+            break
+        chunks.append(data)
+    os.close(fd)
+    return b"".join(chunks)
+
+
+def _start(sim, index, setup, steps, collect):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Processo figlio: esegue la diramazione, manda il risultato al padre ed esce
+        os.close(read_fd)
+        # Come in Simulation.fork la diramazione non eredita registratore, statistiche e
+        # callback: i loro file (e i dati non ancora scritti) restano del padre. Vengono
+        # solo staccati, non chiusi.
+        sim.recorder = None
+        sim.disable_statistics()
+        sim.on_trip_end = None
+        try:
+            payload = ("ok", _run_branch(sim, index, setup, steps, collect))
+        except BaseException:
+            payload = ("error", traceback.format_exc())
+        try:
+            with os.fdopen(write_fd, "wb") as f:
+                pickle.dump(payload, f)
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def _finish(pid, read_fd):
+    data = _read_all(read_fd)
+    os.waitpid(pid, 0)
+    if not data:
+        raise RuntimeError(f"Branch process {pid} exited without a result.")
+    status, value = pickle.loads(data)
+    if status == "error":
+        raise RuntimeError(f"Branch process {pid} failed:\n{value}")
+    return value
+
+
+def run_branches(sim, branches, steps, collect=None, max_workers=None):
+    """
+    Esegue `steps` passi per ogni diramazione di `sim` e restituisce una riga di risultati
+    (dict, vedi runner.summarize) per diramazione, nell'ordine di `branches`.
+    - branches: una funzione setup(simulazione) per diramazione, applicata prima di partire
+      (es. un piano semaforico diverso); None = nessuna modifica
+    - collect: funzione(simulazione) il cui valore (serializzabile) finisce in row["result"]
+    - max_workers: processi contemporanei (default: CPU disponibili)
+    `sim` non viene modificata.
+    """
+    if not hasattr(os, "fork"):
+        random_state = np.random.get_state()
+        rows = []
+        for index, setup in enumerate(branches):
+            np.random.set_state(random_state)
+            rows.append(_run_branch(sim.fork(), index, setup, steps, collect))
+        return rows
+
+    max_workers = max_workers or os.cpu_count() or 1
+    rows = [None] * len(branches)
+    running = []  # [(indice, pid, fd di lettura)] in ordine di avvio
+    try:
+        for index, setup in enumerate(branches):
+            if len(running) == max_workers:
+                first, pid, read_fd = running.pop(0)
+                rows[first] = _finish(pid, read_fd)
+            running.append((index, *_start(sim, index, setup, steps, collect)))
+        while running:
+            first, pid, read_fd = running.pop(0)
+            rows[first] = _finish(pid, read_fd)
+    finally:
+        # In caso di errore non lasciamo processi figli orfani
+        for _, pid, read_fd in running:
+            os.close(read_fd)
+            os.waitpid(pid, 0)
+    return rows
@@ -0,0 +1,127 @@
+"""Esecuzione headless da riga di comando.
+
+    python -m trafficSimulator run config.json --steps 3600 --dt 0.1 --output summary.json
+    python -m trafficSimulator run config.json --steps 3600 --profile
+    python -m trafficSimulator compile config.json --cache-dir .network_cache
+    python -m trafficSimulator sweep config.json --grid grid.json --steps 3600 --seeds 0 1 2 -o results.csv
+    python -m trafficSimulator import-time --budget-ms 250
+
+Non importa mai il visualizzatore (né dearpygui): può girare su macchine senza display.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from .core.config_loader import ConfigLoader
+from .core.network_cache import cache_path
+from .core.profiler import format_report
+from .runner import run
+from .sweep import run_sweep, write_table
+
+
+# Budget per "import trafficSimulator" + accesso a Simulation/ConfigLoader in modalità headless
+IMPORT_TIME_BUDGET_MS = 250
+# Moduli che un import headless non deve caricare
+HEAVY_MODULES = ("dearpygui", "scipy")
+
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import trafficSimulator
+trafficSimulator.Simulation, trafficSimulator.ConfigLoader
+elapsed = time.perf_counter() - start
+heavy = sorted({name.split('.')[0] for name in sys.modules} & set(sys.argv[1:]))
+print(elapsed * 1000, ','.join(heavy))
+"""
+
+
+def measure_import_time(repeat=5):
+    """Tempo (ms, minimo su `repeat` processi nuovi) di un import headless e moduli pesanti caricati"""
+    timings = []
+    heavy = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _IMPORT_PROBE, *HEAVY_MODULES],
+                             capture_output=True, text=True, check=True).stdout.split()
+        timings.append(float(out[0]))
+        heavy = out[1].split(',') if len(out) > 1 else []
+    return min(timings), heavy
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m trafficSimulator", description="Traffic simulator (headless)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Esegue una simulazione da file JSON senza finestra")
+    run_parser.add_argument("config", help="File di configurazione JSON (vedi ConfigLoader)")
+    run_parser.add_argument("--steps", type=int, required=True, help="Numero di passi da simulare")
+    run_parser.add_argument("--dt", type=float, default=None, help="Passo temporale in secondi (default 1/60)")
+    run_parser.add_argument("--engine", choices=("scalar", "vectorized"), default="scalar")
+    run_parser.add_argument("--seed", type=int, default=None, help="Seed del generatore casuale")
+    run_parser.add_argument("--output", "-o", default=None, help="File JSON in cui scrivere le metriche")
+    run_parser.add_argument("--cache-dir", default=None, help="Cartella delle reti compilate (vedi 'compile')")
+    run_parser.add_argument("--profile", action="store_true", help="Misura e stampa i tempi per fase di update")
+
+    compile_parser = commands.add_parser("compile", help="Costruisce la rete e la salva in una cache binaria")
+    compile_parser.add_argument("config", help="File di configurazione JSON")
+    compile_parser.add_argument("--cache-dir", required=True, help="Cartella in cui salvare la rete compilata")
+
+    sweep_parser = commands.add_parser("sweep", help="Esegue una griglia di scenari in parallelo")
+    sweep_parser.add_argument("config", help="Configurazione JSON di base")
+    sweep_parser.add_argument("--grid", required=True,
+                              help='JSON {"percorso.del.parametro": [valori, ...]}, es. "vehicle_generators.0.vehicle_rate"')
+    sweep_parser.add_argument("--steps", type=int, required=True)
+    sweep_parser.add_argument("--dt", type=float, default=None)
+    sweep_parser.add_argument("--engine", choices=("scalar", "vectorized"), default="scalar")
+    sweep_parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="Un'esecuzione per seed e combinazione")
+    sweep_parser.add_argument("--workers", type=int, default=None, help="Numero di processi (default: CPU disponibili)")
+    sweep_parser.add_argument("--output", "-o", required=True, help="Tabella dei risultati (.csv o .json)")
+
+    time_parser = commands.add_parser("import-time", help="Misura il tempo di import headless rispetto al budget")
+    time_parser.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    time_parser.add_argument("--repeat", type=int, default=5)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "run":
+        metrics = run(args.config, args.steps, args.dt, args.engine, args.seed, args.output, args.cache_dir,
+                      args.profile)
+        print(f"Simulated {metrics['simulated_seconds']:.1f}s in {metrics['wall_time_s']:.2f}s wall time "
+              f"({metrics['sim_seconds_per_second']:.1f} sim-s/s, {metrics['steps_per_second']:.0f} steps/s)")
+        if args.profile:
+            print("\n".join(format_report(metrics["profile"])))
+        if args.output:
+            print(f"Metrics written to {args.output}")
+
+    elif args.command == "compile":
+        with open(args.config) as f:
+            config = json.load(f)
+        loader = ConfigLoader(cache_dir=args.cache_dir)
+        start = time.perf_counter()
+        sim, routes = loader.compile(config)
+        elapsed = time.perf_counter() - start
+        print(f"Compiled {len(sim.segments)} segments and {len(routes)} routes in {elapsed:.2f}s "
+              f"-> {cache_path(args.cache_dir, config)}")
+
+    elif args.command == "sweep":
+        with open(args.config) as f:
+            config = json.load(f)
+        with open(args.grid) as f:
+            grid = json.load(f)
+        rows = run_sweep(config, grid, args.steps, args.dt, args.engine, args.seeds, args.workers)
+        write_table(rows, args.output)
+        print(f"{len(rows)} runs written to {args.output}")
+
+    elif args.command == "import-time":
+        elapsed, heavy = measure_import_time(args.repeat)
+        print(f"import trafficSimulator (headless): {elapsed:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        if heavy:
+            print(f"Heavy modules loaded at import: {', '.join(heavy)}")
+        if elapsed > args.budget_ms or heavy:
+            return 1
+    return 0
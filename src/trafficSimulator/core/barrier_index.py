@@ -0,0 +1,55 @@
+from bisect import bisect_right
+import numpy as np
+
+
+class BarrierIndex:
+    """Indice: segmento -> barriere (ostacoli e semafori rossi) ordinate per posizione.
+
+    La simulazione lo aggiorna solo quando qualcosa cambia (ostacolo creato o
+    scaduto, semaforo che cambia colore), così ogni veicolo trova la barriera
+    più vicina con una ricerca binaria invece di filtrare tutte le barriere.
+    """
+
+    def __init__(self):
+        self.positions = {}  # {segment_index: [x, ...]} ordinate
+        self.barriers = {}   # {segment_index: [barriera, ...]} stesso ordine di positions
+        self._arrays = {}    # {segment_index: (posizioni, lunghezze)} per il motore vettoriale
+
+    def add(self, barrier):
+        positions = self.positions.setdefault(barrier.segment_id, [])
+        barriers = self.barriers.setdefault(barrier.segment_id, [])
+        i = bisect_right(positions, barrier.x)
+        positions.insert(i, barrier.x)
+        barriers.insert(i, barrier)
+        self._arrays.pop(barrier.segment_id, None)
+
+    def remove(self, barrier):
+        barriers = self.barriers.get(barrier.segment_id, [])
+        for i, other in enumerate(barriers):
+            if other is barrier:
+                del barriers[i]
+                del self.positions[barrier.segment_id][i]
+                self._arrays.pop(barrier.segment_id, None)
+                return
+
+    def nearest_ahead(self, segment_index, x):
+        """Barriera più vicina con posizione > x sul segmento (o None)"""
+        positions = self.positions.get(segment_index)
+        if not positions:
+            return None
+        i = bisect_right(positions, x)
+        if i == len(positions):
+            return None
+        return self.barriers[segment_index][i]
+
+    def arrays(self, segment_index):
+        """Posizioni e lunghezze delle barriere del segmento come array NumPy (o None)"""
+        if not self.positions.get(segment_index):
+            return None
+        if segment_index not in self._arrays:
+            barriers = self.barriers[segment_index]
+            self._arrays[segment_index] = (
+                np.array(self.positions[segment_index]),
+                np.array([b.l for b in barriers], dtype=float)
+            )
+        return self._arrays[segment_index]
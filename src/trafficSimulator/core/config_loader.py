@@ -1,9 +1,16 @@
 import json
+import os
 from .simulation import Simulation
+from .geometry.segment import Segment
+from .geometry.quadratic_curve import QuadraticCurve
+from .network_cache import cache_path, save_network, load_network
 
 class ConfigLoader:
-    def __init__(self):
-        pass
+    def __init__(self, engine="scalar", cache_dir=None):
+        # Motore dei veicoli delle simulazioni create ("scalar" o "vectorized")
+        self.engine = engine
+        # Cartella delle reti compilate (vedi compile): None = rete ricostruita ogni volta
+        self.cache_dir = cache_dir
 
     def load_from_file(self, file_path):
         with open(file_path, 'r') as f:
@@ -11,19 +18,76 @@ class ConfigLoader:
         return self.create_simulation_from_config(config), config
 
     def create_simulation_from_config(self, config):
-        sim = Simulation()
+        if self.cache_dir is None:
+            sim = self.build_network(config)
+            self.populate(sim, config)
+            return sim
+
+        path = cache_path(self.cache_dir, config)
+        if os.path.exists(path):
+            sim, routes = self.load_compiled(config, path)
+        else:
+            sim, routes = self.compile(config, path)
+        self.populate(sim, config, routes)
+        return sim
+
+    def compile(self, config, path=None):
+        """
+        Costruisce la rete, risolve i percorsi dei generatori e salva tutto in un file di cache
+        (default: nella cartella cache_dir, con nome dato dall'hash della configurazione).
+        Restituisce (simulazione con la sola rete, percorsi).
+        """
+        if path is None:
+            if self.cache_dir is None:
+                raise ValueError("A cache_dir or an explicit path is required to compile a network.")
+            path = cache_path(self.cache_dir, config)
+        sim = self.build_network(config)
+        routes = self.resolve_routes(sim, config)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        save_network(path, sim.segments, sim.topology, routes)
+        return sim, routes
+
+    def load_compiled(self, config, path):
+        """Ricrea la rete da un file scritto da compile: restituisce (simulazione, percorsi)"""
+        tables, adjacency, routes = load_network(path)
+        sim = Simulation(engine=self.engine)
+
+        segments = []
+        specs = [conf for conf in config.get("segments", []) if conf.get("type", "line") in ("line", "quadratic")]
+        for seg_conf, table in zip(specs, tables):
+            kwargs = self._segment_kwargs(seg_conf)
+            if seg_conf.get("type", "line") == "quadratic":
+                seg = QuadraticCurve.from_tables(*table, **kwargs)
+                seg.start = tuple(seg_conf["start"])
+                seg.control = tuple(seg_conf["control"])
+                seg.end = tuple(seg_conf["end"])
+            else:
+                seg = Segment.from_tables(*table, **kwargs)
+            segments.append(seg)
+        sim.add_segments(segments, adjacency)
+
+        self._add_environment(sim, config)
+        return sim, routes
+
+    @staticmethod
+    def _segment_kwargs(seg_conf):
+        # Argomenti comuni (category, max_speed)
+        return {
+            "category": seg_conf.get("category", "general"),
+            "max_speed": seg_conf.get("max_speed", 50),
+            "id_segment": seg_conf.get("id", None)
+        }
+
+    def build_network(self, config):
+        """Crea una simulazione con la sola rete stradale (segmenti e ambiente) della configurazione"""
+        sim = Simulation(engine=self.engine)
 
         # 1. Carica i Segmenti Stradali
         for seg_conf in config.get("segments", []):
             # Estrae i punti (start, end) o curve
             seg_type = seg_conf.get("type", "line")
             
-            # Argomenti comuni (category, max_speed)
-            kwargs = {
-                "category": seg_conf.get("category", "general"),
-                "max_speed": seg_conf.get("max_speed", 50),
-                "id_segment": seg_conf.get("id", None)
-            }
+            kwargs = self._segment_kwargs(seg_conf)
 
             if seg_type == "line":
                 p1 = tuple(seg_conf["start"])
@@ -36,7 +100,61 @@ class ConfigLoader:
                 p2 = tuple(seg_conf["end"])
                 sim.create_quadratic_bezier_curve(p1, control, p2, **kwargs)
 
-        # 2. Carica i Generatori di Veicoli
+        # 2. Carica gli Oggetti Ambientali (Static Objects)
+        self._add_environment(sim, config)
+        return sim
+
+    def _add_environment(self, sim, config):
+        for obj_conf in config.get("environment", []):
+            sim.create_static_object(
+                x=obj_conf["x"],
+                y=obj_conf["y"],
+                width=obj_conf["width"],
+                height=obj_conf["height"],
+                color=tuple(obj_conf["color"]),
+                shape=obj_conf.get("shape", "rectangle")
+            )
+
+    def resolve_routes(self, sim, config):
+        """
+        Percorsi di tutte le coppie start_road -> end_road dei generatori: {(start_id, end_id): [indici]}.
+        Una sola ricerca per ogni origine, qualunque sia il numero di destinazioni.
+        """
+        destinations = {}
+        for gen_conf in config.get("vehicle_generators", []):
+            for veh_conf in gen_conf.get("vehicles", []):
+                specs = veh_conf[1]
+                if "path" not in specs and "start_road" in specs and "end_road" in specs:
+                    destinations.setdefault(specs["start_road"], set()).add(specs["end_road"])
+        routes = {}
+        for start_id, end_ids in destinations.items():
+            for end_id, path in sim.find_shortest_paths(start_id, sorted(end_ids)).items():
+                routes[(start_id, end_id)] = path
+        return routes
+
+    def populate(self, sim, config, routes=None):
+        """
+        Aggiunge a una rete già costruita (vedi build_network) semafori e generatori di veicoli.
+        routes: percorsi già risolti (vedi resolve_routes), altrimenti calcolati qui.
+        """
+        # 3. Carica i Semafori
+        for tl_conf in config.get("traffic_lights", []):
+            segment = tl_conf["segment"]
+            # Il segmento può essere indicato con il suo ID stringa o con l'indice numerico
+            if isinstance(segment, str):
+                segment = sim._segment_index_by_id(segment, "Traffic light")
+            sim.create_traffic_light(
+                segment,
+                tl_conf["position"],
+                cycle_time=tl_conf.get("cycle_time", 5),
+                initial_state=tl_conf.get("initial_state", "red")
+            )
+
+        # 4. Carica i Generatori di Veicoli
+        # Risolviamo prima tutte le coppie start_road -> end_road
+        if routes is None:
+            routes = self.resolve_routes(sim, config)
+
         for gen_conf in config.get("vehicle_generators", []):
             rate = gen_conf.get("vehicle_rate", 10)
             vehicles = []
@@ -55,8 +173,8 @@ class ConfigLoader:
                     start_id = specs["start_road"]
                     end_id = specs["end_road"]
                     
-                    # Calcoliamo il percorso usando la simulazione
-                    calculated_path = sim.find_shortest_path(start_id, end_id)
+                    # Percorso già calcolato sopra
+                    calculated_path = list(routes[(start_id, end_id)])
                     
                     if not calculated_path:
                          print(f"Warning: No path found between {start_id} and {end_id}")
@@ -68,17 +186,4 @@ class ConfigLoader:
 
                 vehicles.append((weight, specs))
             
-            sim.create_vehicle_generator(vehicle_rate=rate, vehicles=vehicles)
-
-        # 3. Carica gli Oggetti Ambientali (Static Objects)
-        for obj_conf in config.get("environment", []):
-            sim.create_static_object(
-                x=obj_conf["x"],
-                y=obj_conf["y"],
-                width=obj_conf["width"],
-                height=obj_conf["height"],
-                color=tuple(obj_conf["color"]),
-                shape=obj_conf.get("shape", "rectangle")
-            )
-
-        return sim
\ No newline at end of file
+            sim.create_vehicle_generator(vehicle_rate=rate, vehicles=vehicles)
\ No newline at end of file
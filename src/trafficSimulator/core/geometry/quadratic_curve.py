@@ -1,4 +1,5 @@
-from .segment import Segment
+from numpy import asarray
+from .segment import Segment, cached_curve_points, batch_normalized_paths
 
 PAS = 0.01
 CURVE_RESOLUTION = 50
@@ -9,19 +10,26 @@ class QuadraticCurve(Segment):
         self.control = control
         self.end = end
 
-        # Generate path
-        path = []
-        for i in range(CURVE_RESOLUTION):
-            t = i/(CURVE_RESOLUTION-1)
-            x = t**2*self.end[0] + 2*t*(1-t)*self.control[0] + (1-t)**2*self.start[0]
-            y = t**2*self.end[1] + 2*t*(1-t)*self.control[1] + (1-t)**2*self.start[1]
-            path.append((x, y))
+        # Arc-length parametrization (identical curves, e.g. intersection connectors, are computed once)
+        key = ("quadratic", (tuple(start), tuple(control), tuple(end)), CURVE_RESOLUTION)
+        path = cached_curve_points(key, lambda: self.find_normalized_path(CURVE_RESOLUTION))
+        super().__init__(path, **kwargs)
 
-        super().__init__(path)
-
-        # Arc-length parametrization
-        normalized_path = self.find_normalized_path(CURVE_RESOLUTION)
-        super().__init__(normalized_path, **kwargs)
+    @classmethod
+    def batch(cls, starts, controls, ends, categories, max_speeds, ids):
+        """Creates n curves from arrays (n, 2) of control points with one vectorized reparametrization"""
+        columns = [asarray(a, dtype=float).reshape(-1, 2) for a in (starts, controls, ends)]
+        # Template curve with column arrays as control points: compute_x/compute_y evaluate all curves at once
+        shape = cls.__new__(cls)
+        shape.start = (columns[0][:, 0:1], columns[0][:, 1:2])
+        shape.control = (columns[1][:, 0:1], columns[1][:, 1:2])
+        shape.end = (columns[2][:, 0:1], columns[2][:, 1:2])
+        curves = cls.batch_from_points(batch_normalized_paths(shape, CURVE_RESOLUTION), categories, max_speeds, ids)
+        for curve, start, control, end in zip(curves, *(map(tuple, c.tolist()) for c in columns)):
+            curve.start = start
+            curve.control = control
+            curve.end = end
+        return curves
 
     def compute_x(self, t):
         return t**2*self.end[0] + 2*t*(1-t)*self.control[0] + (1-t)**2*self.start[0]
@@ -1,10 +1,57 @@
-from scipy.spatial import distance
-from scipy.interpolate import interp1d
-from collections import deque
-from numpy import arctan2, unwrap, linspace
+from collections import OrderedDict, deque
+from bisect import bisect_right
+from numpy import arctan2, unwrap, asarray, diff, hypot, cumsum, concatenate, linspace, interp, zeros, stack, arange
 from abc import ABC, abstractmethod
 from math import sqrt
-from scipy.integrate import quad
+
+# Number of samples used to build the arc-length table of a curve
+ARC_LENGTH_SAMPLES = 1024
+
+# Already reparametrized curves: {(curve type, control points, resolution): points},
+# least recently used first; bounded so long-lived processes building many networks don't grow
+CURVE_CACHE_SIZE = 4096
+_curve_cache = OrderedDict()
+
+
+def cached_curve_points(key, build):
+    """Returns the points stored under key, calling build() only if they are not cached"""
+    points = _curve_cache.get(key)
+    if points is None:
+        points = _curve_cache[key] = build()
+        if len(_curve_cache) > CURVE_CACHE_SIZE:
+            _curve_cache.popitem(last=False)
+    else:
+        _curve_cache.move_to_end(key)
+    return list(points)
+
+
+def polyline_tables(points):
+    """Geometry tables of set_functions for a batch of polylines with the same number of points.
+
+    points: array (n, P, 2). Returns cumulative_length (n, P), piece_lengths (n, P-1),
+    deltas (n, P-1, 2) and headings (n, P-1), computed in one vectorized pass.
+    """
+    deltas = diff(points, axis=1)
+    piece_lengths = hypot(deltas[..., 0], deltas[..., 1])
+    cumulative_length = concatenate((zeros((len(points), 1)), cumsum(piece_lengths, axis=1)), axis=1)
+    headings = unwrap(arctan2(deltas[..., 1], deltas[..., 0]), axis=1)
+    return cumulative_length, piece_lengths, deltas, headings
+
+
+def batch_normalized_paths(curve, resolution):
+    """Vectorized find_normalized_path for many curves of the same type at once.
+
+    curve: instance whose control points are column arrays of shape (n, 1), so that
+    compute_x/compute_y broadcast over all curves. Returns an array (n, resolution, 2).
+    """
+    t = linspace(0, 1, ARC_LENGTH_SAMPLES)
+    x, y = curve.compute_x(t), curve.compute_y(t)
+    arc = concatenate((zeros((len(x), 1)), cumsum(hypot(diff(x, axis=1), diff(y, axis=1)), axis=1)), axis=1)
+    # Same targets as linspace(0, length, resolution) for every curve, computed all at once
+    targets = arange(resolution) * (arc[:, -1:] / (resolution - 1))
+    targets[:, -1] = arc[:, -1]
+    t_new = stack([interp(row_targets, row, t) for row_targets, row in zip(targets, arc)])
+    return stack((curve.compute_x(t_new), curve.compute_y(t_new)), axis=-1)
 
 class Segment(ABC):
     def __init__(self, points, category="general", max_speed=50, id_segment=None):
@@ -15,28 +62,90 @@ class Segment(ABC):
         self.id_segment = id_segment    # Identificativo mnemonico (stringa)
         
         self.vehicles = deque()
+        self.stats = None  # SegmentAccumulator while Simulation statistics are enabled
+
+    @classmethod
+    def from_tables(cls, points, cumulative_length, piece_lengths, deltas, headings,
+                    category="general", max_speed=50, id_segment=None):
+        """Builds a segment from precomputed geometry tables (see set_functions) without recomputing them"""
+        seg = cls.__new__(cls)
+        seg._points = points
+        seg.cumulative_length = cumulative_length
+        seg.length = cumulative_length[-1]
+        seg.piece_lengths = piece_lengths
+        seg.deltas = deltas
+        seg.headings = headings
+        seg.category = category
+        seg.max_speed = max_speed
+        seg.id_segment = id_segment
+        seg.vehicles = deque()
+        seg.stats = None
+        return seg
+
+    @classmethod
+    def batch_from_points(cls, points, categories, max_speeds, ids):
+        """Creates one segment per polyline of `points` (n, P, 2), with one value per segment
+        in categories, max_speeds and ids. Geometry tables are computed for all at once."""
+        points = asarray(points, dtype=float)
+        tables = [table.tolist() for table in polyline_tables(points)]
+        return [cls.from_tables(list(map(tuple, pts)), cum, pieces, deltas, headings,
+                                category=category, max_speed=max_speed, id_segment=id_segment)
+                for pts, cum, pieces, deltas, headings, category, max_speed, id_segment
+                in zip(points.tolist(), *tables, categories, max_speeds, ids)]
+
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        # Geometry tables are rebuilt only when the polyline is replaced
+        self._points = points
         self.set_functions()
-        
 
     def set_functions(self):
-        # Point
-        self.get_point = interp1d(linspace(0, 1, len(self.points)), self.points, axis=0)
-        
-        # Heading
-        headings = unwrap([arctan2(
-            self.points[i+1][1] - self.points[i][1],
-            self.points[i+1][0] - self.points[i][0]
-        ) for i in range(len(self.points)-1)])
-        if len(headings) == 1:
-            self.get_heading = lambda x: headings[0]
-        else:
-            self.get_heading = interp1d(linspace(0, 1, len(self.points)-1), headings, axis=0)
+        """Precomputes length, cumulative arc-length table and heading table of the polyline"""
+        pts = asarray(self._points, dtype=float)
+        deltas = diff(pts, axis=0)
+        piece_lengths = hypot(deltas[:, 0], deltas[:, 1])
+
+        # cumulative_length[i] = distance (in metres) of points[i] from the start
+        self.cumulative_length = concatenate(([0.0], cumsum(piece_lengths))).tolist()
+        self.length = self.cumulative_length[-1]
+        self.piece_lengths = piece_lengths.tolist()
+        self.deltas = deltas.tolist()
+        self.headings = unwrap(arctan2(deltas[:, 1], deltas[:, 0])).tolist()
 
     def get_length(self):
-        length = 0
-        for i in range(len(self.points) -1):
-            length += distance.euclidean(self.points[i], self.points[i+1])
-        return length
+        return self.length
+
+    def _piece_at(self, distance):
+        """Index of the polyline piece containing the given distance (binary search)"""
+        i = bisect_right(self.cumulative_length, distance) - 1
+        return min(max(i, 0), len(self.piece_lengths) - 1)
+
+    def get_point_at(self, distance):
+        """Returns the (x, y) point located `distance` metres from the start"""
+        distance = min(max(distance, 0.0), self.length)
+        i = self._piece_at(distance)
+        x, y = self._points[i]
+        if self.piece_lengths[i] == 0:
+            return (x, y)
+        frac = (distance - self.cumulative_length[i]) / self.piece_lengths[i]
+        dx, dy = self.deltas[i]
+        return (x + frac*dx, y + frac*dy)
+
+    def get_heading_at(self, distance):
+        """Returns the heading (radians) of the road `distance` metres from the start"""
+        return self.headings[self._piece_at(distance)]
+
+    def get_point(self, t):
+        """Point at normalized position t in [0, 1]"""
+        return self.get_point_at(t*self.length)
+
+    def get_heading(self, t):
+        """Heading at normalized position t in [0, 1]"""
+        return self.get_heading_at(t*self.length)
 
     def add_vehicle(self, veh):
         self.vehicles.append(veh.id)
@@ -76,6 +185,9 @@ class Segment(ABC):
             precision of the approximation
         """
         
+        # SciPy is heavy to import: load it only when a curve actually needs it
+        from scipy.integrate import quad
+
         def f(t):
             integral_value, _ = quad(self.abs_f, a, t)
             return integral_value
@@ -95,15 +207,14 @@ class Segment(ABC):
         return mid_point
     
     def find_normalized_path(self, CURVE_RESOLUTION=50):
-        normalized_path = [(self.compute_x(0), self.compute_y(0))]
-        l = self.get_length()
-        target_l = l/(CURVE_RESOLUTION-1)
-        epsilon = 0.01
-        a = 0
-        for i in range(CURVE_RESOLUTION-1):
-            t = self.find_t(a, target_l, epsilon)
-            new_point = (self.compute_x(t), self.compute_y(t))
-            normalized_path.append(new_point)
-            if t == 1: break
-            else:      a = t
-        return normalized_path
\ No newline at end of file
+        """Returns CURVE_RESOLUTION points equally spaced by arc length along the curve.
+
+        The curve is sampled densely (vectorized compute_x/compute_y), the cumulative
+        length table is built once and inverted by linear interpolation: no numerical
+        integration per point.
+        """
+        t = linspace(0, 1, ARC_LENGTH_SAMPLES)
+        x, y = self.compute_x(t), self.compute_y(t)
+        arc = concatenate(([0.0], cumsum(hypot(diff(x), diff(y)))))
+        t_new = interp(linspace(0, arc[-1], CURVE_RESOLUTION), arc, t)
+        return list(zip(self.compute_x(t_new).tolist(), self.compute_y(t_new).tolist()))
@@ -22,23 +22,32 @@ class Intersection:
         self.priority_map = {} # {segment_index: [lista_indici_prioritari]}
         self.stopped_vehicles = set() # {vehicle_id}
 
+        # Riepilogo delle strade entranti, ricalcolato una volta per passo (vedi approach_summary)
+        self.incoming_indices = []
+        self.approaches = {}  # {segment_index: (distanza dall'incrocio, velocità)}
+        self._approaches_frame = None
+
     def add_incoming(self, segment):
-        """Registra una strada che ARRIVA all'incrocio"""
+        """Registra una strada che ARRIVA all'incrocio (ValueError se non è nella simulazione)"""
+        self._register(segment, incoming=True)
         self.incoming_roads.append(segment)
         if segment.id_segment not in self.paths:
             self.paths[segment.id_segment] = {}
 
     def add_outgoing(self, segment):
-        """Registra una strada che PARTE dall'incrocio"""
+        """Registra una strada che PARTE dall'incrocio (ValueError se non è nella simulazione)"""
+        self._register(segment, incoming=False)
         self.outgoing_roads.append(segment)
 
+    def _register(self, segment, incoming):
+        # Indice nella simulazione: il loop di update trova l'incrocio in O(1)
+        index = self.sim.register_intersection_road(self, segment, incoming)
+        if incoming:
+            self.incoming_indices.append(index)
+
     def add_stop_sign(self, road):
-        """Aggiunge un segnale di STOP alla strada specificata"""
-        try:
-            seg_index = self.sim.segments.index(road)
-            self.stop_signs[seg_index] = True
-        except ValueError:
-            print(f"Warning: Road {road.id_segment} not found in simulation.")
+        """Aggiunge un segnale di STOP alla strada specificata (ValueError se non è nella simulazione)"""
+        self.stop_signs[self.sim.index_of(road)] = True
 
     def set_traffic_lights(self, cycle_time=10):
         """Aggiunge semafori automatici (Verde Nord-Sud, Rosso Est-Ovest)"""
@@ -64,7 +73,7 @@ class Intersection:
         pos = road.get_length() - 2
         if pos < 0: pos = 0
         try:
-            seg_index = self.sim.segments.index(road)
+            seg_index = self.sim.index_of(road)
             self.sim.create_traffic_light(seg_index, pos, cycle_time, initial_state)
         except ValueError:
             pass
@@ -113,7 +122,7 @@ class Intersection:
         """Costruisce la mappa delle precedenze"""
         for road_a in self.incoming_roads:
             try:
-                idx_a = self.sim.segments.index(road_a)
+                idx_a = self.sim.index_of(road_a)
             except ValueError:
                 continue
 
@@ -125,7 +134,7 @@ class Intersection:
                 for road_b in self.incoming_roads:
                     if road_a == road_b: continue
                     try:
-                        idx_b = self.sim.segments.index(road_b)
+                        idx_b = self.sim.index_of(road_b)
                         self.priority_map[idx_a].append(idx_b)
                     except ValueError:
                         continue
@@ -135,7 +144,7 @@ class Intersection:
             for road_b in self.incoming_roads:
                 if road_a == road_b: continue
                 try:
-                    idx_b = self.sim.segments.index(road_b)
+                    idx_b = self.sim.index_of(road_b)
                     
                     # Se l'altro ha STOP, lo ignoro (lui aspetta me)
                     if idx_b in self.stop_signs:
@@ -167,14 +176,31 @@ class Intersection:
         # 2. Controllo Strade Prioritarie
         priority_segments = self.priority_map.get(segment_index, [])
         scan_distance = 40 
+        approaches = self.approach_summary()
         
         for other_idx in priority_segments:
-            other_seg = self.sim.segments[other_idx]
-            for veh_id in other_seg.vehicles:
-                other_veh = self.sim.vehicles[veh_id]
-                dist_to_inter = other_seg.get_length() - other_veh.x
-                
-                if dist_to_inter < scan_distance and other_veh.v > 0.5:
-                    return False # Qualcuno sta arrivando da una strada prioritaria
+            nearest = approaches.get(other_idx)
+            if nearest and nearest[0] < scan_distance:
+                return False # Qualcuno sta arrivando da una strada prioritaria
                     
-        return True
\ No newline at end of file
+        return True
+
+    def approach_summary(self):
+        """
+        Per ogni strada entrante: (distanza dall'incrocio, velocità) del veicolo in movimento
+        (v > 0.5) più vicino all'incrocio. Calcolato alla prima richiesta di ogni passo e
+        condiviso da tutti i veicoli in attesa.
+        """
+        if self._approaches_frame != self.sim.frame_count:
+            self._approaches_frame = self.sim.frame_count
+            approaches = {}
+            for index in self.incoming_indices:
+                road = self.sim.segments[index]
+                # I veicoli sono in ordine dal più avanti: il primo in movimento è il più vicino
+                for veh_id in road.vehicles:
+                    veh = self.sim.vehicles[veh_id]
+                    if veh.v > 0.5:
+                        approaches[index] = (road.get_length() - veh.x, veh.v)
+                        break
+            self.approaches = approaches
+        return self.approaches
\ No newline at end of file
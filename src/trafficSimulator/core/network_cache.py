@@ -0,0 +1,89 @@
+"""Cache su disco delle reti costruite da ConfigLoader (rete "compilata").
+
+Un solo file .npz non compresso per configurazione, con nome dato dall'hash del JSON:
+punti delle polilinee, tabelle di lunghezza d'arco e direzione, adiacenza (CSR) e
+percorsi già risolti dei generatori. Ricaricarlo evita la riparametrizzazione delle
+curve, la ricerca delle connessioni e il calcolo dei percorsi.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Da incrementare quando cambia il contenuto del file: le cache vecchie vengono ignorate
+CACHE_FORMAT = 1
+
+
+def config_hash(config):
+    text = json.dumps(config, sort_keys=True)
+    return hashlib.sha1(f"{CACHE_FORMAT}:{text}".encode()).hexdigest()
+
+
+def cache_path(cache_dir, config):
+    """File di cache della configurazione nella cartella cache_dir"""
+    return os.path.join(cache_dir, config_hash(config) + ".npz")
+
+
+def _csr(lists):
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(items) for items in lists])
+    indices = np.array([item for items in lists for item in items], dtype=np.int64)
+    return indptr, indices
+
+
+def save_network(path, segments, topology, routes):
+    """
+    Salva in `path` la geometria dei segmenti, la loro adiacenza e i percorsi
+    {(start_id, end_id): [indici]}. La scrittura è atomica (file temporaneo + rename).
+    """
+    offsets, _ = _csr([seg.points for seg in segments])
+    points = np.array([p for seg in segments for p in seg.points], dtype=float).reshape(-1, 2)
+    cumulative_length = np.array([c for seg in segments for c in seg.cumulative_length], dtype=float)
+    headings = np.array([h for seg in segments for h in seg.headings], dtype=float)
+    indptr, indices = _csr([topology.successors.get(i, []) for i in range(len(segments))])
+    route_keys = list(routes)
+    route_indptr, route_indices = _csr([routes[key] for key in route_keys])
+
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        np.savez(f,
+                 offsets=offsets, points=points,
+                 cumulative_length=cumulative_length, headings=headings,
+                 indptr=indptr, indices=indices,
+                 route_keys=np.array(json.dumps(route_keys)),
+                 route_indptr=route_indptr, route_indices=route_indices)
+    os.replace(tmp, path)
+
+
+def load_network(path):
+    """
+    Legge un file scritto da save_network. Restituisce:
+    - per ogni segmento le tabelle (points, cumulative_length, piece_lengths, deltas, headings)
+      nel formato di Segment.from_tables
+    - l'adiacenza (indptr, indices)
+    - i percorsi {(start_id, end_id): [indici]}
+    """
+    with np.load(path) as data:
+        offsets = data["offsets"].tolist()
+        points = data["points"]
+        deltas = np.diff(points, axis=0)
+        piece_lengths = np.hypot(deltas[:, 0], deltas[:, 1]).tolist()
+        deltas = deltas.tolist()
+        points = list(map(tuple, points.tolist()))
+        cumulative_length = data["cumulative_length"].tolist()
+        headings = data["headings"].tolist()
+        adjacency = (data["indptr"].tolist(), data["indices"].tolist())
+        route_keys = json.loads(str(data["route_keys"]))
+        route_indptr = data["route_indptr"].tolist()
+        route_indices = data["route_indices"].tolist()
+
+    tables = []
+    for i in range(len(offsets) - 1):
+        a, b = offsets[i], offsets[i+1]
+        # I tratti del segmento i sono le differenze tra punti consecutivi dello stesso segmento
+        tables.append((points[a:b], cumulative_length[a:b], piece_lengths[a:b-1], deltas[a:b-1],
+                       headings[a-i:b-i-1]))
+    routes = {tuple(key): route_indices[route_indptr[k]:route_indptr[k+1]]
+              for k, key in enumerate(route_keys)}
+    return tables, adjacency, routes
@@ -12,6 +12,7 @@ class Obstacle:
         
         self.time_elapsed = 0
         self.active = True
+        self.expires_at = None  # tempo di scadenza (gestito dalla simulazione)
 
     def update(self, dt):
         self.time_elapsed += dt
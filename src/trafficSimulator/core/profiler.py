@@ -0,0 +1,94 @@
+"""Profilazione opzionale di Simulation.update.
+
+    sim.enable_profiling()
+    sim.run(3600)
+    print("\\n".join(format_report(sim.profile_report())))
+
+Con sim.profiler = None (default) update non misura nulla: il costo è un controllo
+per fase. Le fasi principali sono quelle di update; quelle con un punto nel nome
+sono parti di una fase principale (es. "vehicles.idm" è dentro "vehicles").
+"""
+from time import perf_counter_ns
+
+# Fasi principali di Simulation.update, nell'ordine in cui vengono eseguite
+PHASES = ("events", "vehicles", "transfers", "generators", "recorder")
+# Parti della fase "vehicles"
+VEHICLE_PHASES = ("vehicles.intersections", "vehicles.barriers", "vehicles.idm")
+
+
+class Profiler:
+    """Tempo cumulativo (perf_counter_ns) e numero di chiamate per fase, incrocio e generatore"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.steps = 0
+        self.phases = {}         # {fase: [ns, chiamate]}
+        self.intersections = {}  # {id incrocio: [ns, chiamate]} di check_clearance
+        self.generators = {}     # {generatore: [ns, tentativi]}
+
+    @staticmethod
+    def add(table, key, ns):
+        entry = table.get(key)
+        if entry is None:
+            table[key] = [ns, 1]
+        else:
+            entry[0] += ns
+            entry[1] += 1
+
+    def time(self, phase, func, *args):
+        """Esegue func(*args) sommandone la durata alla fase `phase`"""
+        start = perf_counter_ns()
+        result = func(*args)
+        self.add(self.phases, phase, perf_counter_ns() - start)
+        return result
+
+    def report(self, sim=None):
+        """
+        Riepilogo strutturato (dict, serializzabile in JSON). Per ogni voce: tempo totale (ms),
+        chiamate, tempo medio per chiamata (µs) e quota sul tempo totale delle fasi principali.
+        Con `sim` i generatori sono indicati dalla loro posizione in sim.vehicle_generator.
+        """
+        # Copie: la tabella può essere aggiornata da un altro thread (SimulationWorker)
+        phases = dict(self.phases)
+        total_ns = sum(phases[name][0] for name in PHASES if name in phases)
+
+        def entries(table):
+            return {str(key): {"total_ms": ns / 1e6,
+                               "calls": calls,
+                               "mean_us": ns / calls / 1e3,
+                               "share": ns / total_ns if total_ns else 0.0}
+                    for key, (ns, calls) in table.items()}
+
+        generators = dict(self.generators)
+        if sim is not None:
+            labels = {gen: f"generator {i}" for i, gen in enumerate(sim.vehicle_generator)}
+            generators = {labels.get(gen, repr(gen)): entry for gen, entry in generators.items()}
+
+        # Ogni fase principale seguita dalle sue parti
+        ordered = [name for phase in PHASES for name in (phase,) + VEHICLE_PHASES
+                   if name in phases and (name == phase or name.startswith(phase + "."))]
+        return {
+            "steps": self.steps,
+            "total_ms": total_ns / 1e6,
+            "phases": entries({name: phases[name] for name in ordered}),
+            "intersections": entries(dict(self.intersections)),
+            "generators": entries(generators),
+        }
+
+
+def format_report(report, limit=5):
+    """Righe di testo di un report: fasi, poi gli incroci e i generatori più costosi"""
+    steps = max(report["steps"], 1)
+    lines = [f"{report['steps']} steps, {report['total_ms']:.1f} ms ({report['total_ms'] * 1000 / steps:.1f} µs/step)"]
+    for name, entry in report["phases"].items():
+        indent = "    " if "." in name else "  "
+        lines.append(f"{indent}{name:<24}{entry['total_ms']:>10.1f} ms {entry['share']:>6.1%}")
+    for section in ("intersections", "generators"):
+        entries = sorted(report[section].items(), key=lambda item: -item[1]["total_ms"])
+        if entries:
+            lines.append(f"{section} (top {min(limit, len(entries))}):")
+        for key, entry in entries[:limit]:
+            lines.append(f"  {key:<24}{entry['total_ms']:>10.1f} ms {entry['calls']:>8} calls")
+    return lines
@@ -0,0 +1,241 @@
+"""Registrazione per frame dello stato dei veicoli e dei semafori.
+
+    sim.recorder = Recorder("run.rec")
+    sim.run(3600)
+    sim.recorder.close()
+
+    rec = Recording("run.rec")
+    rec.frame(100)["x"]          # posizioni dei veicoli al frame 100 (vista, nessuna copia)
+    rec.column("v")              # tutte le velocità registrate, frame dopo frame
+
+Il file è append-only: un'intestazione e poi una sequenza di blocchi ("chunk"), ognuno
+con frame completi e dati per colonna (tutti gli ID, poi tutti i segmenti, ...). I blocchi
+sono riempiti in array preallocati e scritti con una sola write; la lettura usa np.memmap,
+quindi si può scorrere una registrazione più grande della memoria.
+"""
+import struct
+
+import numpy as np
+
+from .simulation_worker import Snapshot
+
+MAGIC = b"TSREC\x02\x00\x00"
+# Intestazione di un blocco: numero di frame, di righe veicolo e di righe semaforo
+_CHUNK_HEADER = struct.Struct("<3q")
+
+# Una riga per frame
+FRAME_COLUMNS = {"frame": np.int64, "t": np.float64, "vehicles": np.int32, "lights": np.int32}
+# Una riga per veicolo per frame, in ordine di segmento e di posizione nella coda.
+# Gli ID vengono riusati dopo l'uscita di un veicolo: un veicolo è identificato dalla
+# coppia (id, spawn_time)
+VEHICLE_COLUMNS = {"id": np.int32, "spawn_time": np.float64, "segment": np.int32,
+                   "x": np.float32, "v": np.float32, "a": np.float32, "co2": np.float32}
+# Una riga per semaforo per frame (1 = verde, 0 = rosso), nell'ordine di sim.traffic_lights
+LIGHT_COLUMNS = {"state": np.int8}
+_TABLES = (FRAME_COLUMNS, VEHICLE_COLUMNS, LIGHT_COLUMNS)
+
+_ENGINE_FIELDS = {"x": "x", "v": "v", "a": "a", "co2": "co2_emissions"}
+
+
+def _allocate(columns, capacity):
+    return {name: np.empty(capacity, dtype) for name, dtype in columns.items()}
+
+
+def _padded(nbytes):
+    # Ogni colonna inizia a un offset multiplo di 8 byte
+    return (nbytes + 7) & ~7
+
+
+class Recorder:
+    """Registra lo stato della simulazione ad ogni passo (vedi Simulation.recorder).
+
+    - chunk_frames / chunk_rows: capacità dei blocchi preallocati; un blocco viene
+      scritto su file quando il frame successivo non ci sta più
+    """
+
+    def __init__(self, path, chunk_frames=1024, chunk_rows=65536):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._frames = _allocate(FRAME_COLUMNS, chunk_frames)
+        self._rows = _allocate(VEHICLE_COLUMNS, chunk_rows)
+        self._lights = _allocate(LIGHT_COLUMNS, chunk_rows)
+        self._n_frames = 0
+        self._n_rows = 0
+        self._n_lights = 0
+        self.frames_recorded = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _ensure(table, used, needed):
+        """Raddoppia le colonne di `table` finché non ci stanno `needed` righe oltre le `used`"""
+        capacity = len(next(iter(table.values())))
+        if used + needed <= capacity:
+            return
+        while used + needed > capacity:
+            capacity *= 2
+        for name, column in table.items():
+            grown = np.empty(capacity, column.dtype)
+            grown[:used] = column[:used]
+            table[name] = grown
+
+    def record(self, sim):
+        """Aggiunge un frame con lo stato attuale di `sim`"""
+        ids = []
+        segments = []
+        for segment_index in sorted(sim.active_segments):
+            queue = sim.segments[segment_index].vehicles
+            ids.extend(queue)
+            segments.extend([segment_index] * len(queue))
+        n = len(ids)
+        n_lights = len(sim.traffic_lights)
+
+        # Un frame sta sempre tutto in un blocco: se non c'è posto si scrive quello attuale
+        frames_full = self._n_frames == len(self._frames["frame"])
+        rows_full = self._n_rows + n > len(self._rows["id"])
+        lights_full = self._n_lights + n_lights > len(self._lights["state"])
+        if self._n_frames and (frames_full or rows_full or lights_full):
+            self.flush()
+        self._ensure(self._rows, self._n_rows, n)
+        self._ensure(self._lights, self._n_lights, n_lights)
+
+        f = self._n_frames
+        self._frames["frame"][f] = sim.frame_count
+        self._frames["t"][f] = sim.t
+        self._frames["vehicles"][f] = n
+        self._frames["lights"][f] = n_lights
+
+        start, end = self._n_rows, self._n_rows + n
+        rows = self._rows
+        rows["id"][start:end] = ids
+        rows["segment"][start:end] = segments
+        rows["spawn_time"][start:end] = [sim.vehicles[vehicle_id].spawn_time for vehicle_id in ids]
+        if sim.engine is not None:
+            # Motore vettoriale: i valori si leggono direttamente dagli array
+            engine = sim.engine
+            slots = np.fromiter(map(engine.slot_of.__getitem__, ids), dtype=np.intp, count=n)
+            for column, field in _ENGINE_FIELDS.items():
+                rows[column][start:end] = getattr(engine, field)[slots]
+        else:
+            vehicles = [sim.vehicles[vehicle_id] for vehicle_id in ids]
+            for column, field in _ENGINE_FIELDS.items():
+                rows[column][start:end] = [getattr(vehicle, field) for vehicle in vehicles]
+
+        lights = self._lights["state"]
+        for i, tl in enumerate(sim.traffic_lights):
+            lights[self._n_lights + i] = tl.state == "green"
+
+        self._n_frames += 1
+        self._n_rows = end
+        self._n_lights += n_lights
+        self.frames_recorded += 1
+
+    def flush(self):
+        """Scrive in coda al file il blocco in memoria"""
+        if not self._n_frames:
+            return
+        parts = [_CHUNK_HEADER.pack(self._n_frames, self._n_rows, self._n_lights)]
+        for table, used in ((self._frames, self._n_frames), (self._rows, self._n_rows),
+                            (self._lights, self._n_lights)):
+            for column in table.values():
+                data = column[:used].tobytes()
+                parts.append(data + b"\0" * (_padded(len(data)) - len(data)))
+        self._file.write(b"".join(parts))
+        self._file.flush()
+        self._n_frames = self._n_rows = self._n_lights = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+class Recording:
+    """Lettura (memory-mapped) di un file scritto da Recorder.
+
+    frame(i) restituisce viste sul file senza copiare i dati; column(name) concatena
+    una colonna di tutti i blocchi. Un blocco incompleto in coda (registrazione
+    interrotta) viene ignorato.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"'{path}' is not a trafficSimulator recording.")
+        self._data = data
+
+        self._chunks = []  # [(colonne frame, colonne veicoli, colonne semafori)]
+        offset = len(MAGIC)
+        while offset + _CHUNK_HEADER.size <= len(data):
+            counts = _CHUNK_HEADER.unpack(bytes(data[offset:offset + _CHUNK_HEADER.size]))
+            layout = [(columns, count) for columns, count in zip(_TABLES, counts)]
+            size = sum(_padded(np.dtype(dtype).itemsize * count)
+                       for columns, count in layout for dtype in columns.values())
+            position = offset + _CHUNK_HEADER.size
+            if position + size > len(data):
+                break
+            tables = []
+            for columns, count in layout:
+                table = {}
+                for name, dtype in columns.items():
+                    table[name] = np.frombuffer(data, dtype=dtype, count=count, offset=position)
+                    position += _padded(np.dtype(dtype).itemsize * count)
+                tables.append(table)
+            self._chunks.append(tuple(tables))
+            offset = position
+
+        # Indice dei frame: blocco di appartenenza, posizione nel blocco e inizio delle righe
+        frames = [chunk[0] for chunk in self._chunks] or [_allocate(FRAME_COLUMNS, 0)]
+        self.frames = np.concatenate([f["frame"] for f in frames])
+        self.times = np.concatenate([f["t"] for f in frames])
+        self._chunk_of = np.concatenate([np.full(len(f["frame"]), i) for i, f in enumerate(frames)])
+        self._local = np.concatenate([np.arange(len(f["frame"])) for f in frames])
+        self._row_start = np.concatenate([np.cumsum(f["vehicles"]) - f["vehicles"] for f in frames])
+        self._light_start = np.concatenate([np.cumsum(f["lights"]) - f["lights"] for f in frames])
+
+    def __len__(self):
+        return len(self.frames)
+
+    def index_at(self, t):
+        """Indice del primo frame registrato con tempo >= t"""
+        return min(int(np.searchsorted(self.times, t)), len(self) - 1)
+
+    def frame(self, i):
+        """Colonne del frame i (ID, spawn_time, segmento, x, v, a, co2 e "lights")"""
+        frames, rows, lights = self._chunks[self._chunk_of[i]]
+        local = self._local[i]
+        start = self._row_start[i]
+        end = start + frames["vehicles"][local]
+        result = {name: column[start:end] for name, column in rows.items()}
+        light_start = self._light_start[i]
+        result["lights"] = lights["state"][light_start:light_start + frames["lights"][local]]
+        return result
+
+    def column(self, name):
+        """Una colonna dei veicoli (es. "v") su tutta la registrazione, come array unico"""
+        return np.concatenate([chunk[1][name] for chunk in self._chunks] or [np.zeros(0, VEHICLE_COLUMNS[name])])
+
+    def frame_lengths(self):
+        """Numero di veicoli per frame (per ritagliare i risultati di column)"""
+        return np.concatenate([chunk[0]["vehicles"] for chunk in self._chunks] or [np.zeros(0, np.int32)])
+
+    def snapshot(self, i, length=4, width=2, vehicle_class="car"):
+        """Frame i come Snapshot da disegnare (vedi Window). Dimensioni e classe dei
+        veicoli non vengono registrate: si usano quelle indicate."""
+        frame = self.frame(i)
+        segments = frame["segment"].tolist()
+        xs = frame["x"].tolist()
+        groups = []
+        start = 0
+        for end in range(1, len(segments) + 1):
+            if end == len(segments) or segments[end] != segments[start]:
+                groups.append((segments[start], tuple((x, length, width, vehicle_class) for x in xs[start:end])))
+                start = end
+        lights = tuple("green" if state else "red" for state in frame["lights"].tolist())
+        return Snapshot(float(self.times[i]), int(self.frames[i]), tuple(groups), lights, ())
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+from math import hypot
+import heapq
+import numpy as np
+
+# Peso di un arco i -> j = costo per percorrere il segmento j
+WEIGHT_PROFILES = {
+    "length": lambda seg: seg.get_length(),            # metri
+    "time": lambda seg: seg.get_length() / seg.max_speed,  # tempo a velocità massima
+    "hops": lambda seg: 1.0,                            # numero di segmenti
+}
+
+
+class RoutingGraph:
+    """Grafo CSR "congelato" con i pesi degli archi già calcolati.
+
+    Costruito a partire da una Topology; va ricreato se la topologia cambia
+    (vedi Router, che confronta topology.version).
+    """
+
+    def __init__(self, segments, topology, profile="length"):
+        if profile not in WEIGHT_PROFILES:
+            raise ValueError(f"Unknown weight profile '{profile}' (expected one of {list(WEIGHT_PROFILES)}).")
+        weight_of = WEIGHT_PROFILES[profile]
+        n = len(segments)
+
+        self.profile = profile
+        self.version = topology.version
+        self.node_weights = np.array([weight_of(seg) for seg in segments], dtype=float)
+
+        counts = [len(topology.successors.get(i, ())) for i in range(n)]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(counts)
+        self.indices = np.array([j for i in range(n) for j in topology.successors.get(i, ())], dtype=np.int64)
+        self.weights = self.node_weights[self.indices] if len(self.indices) else np.zeros(0)
+
+        # Estremi dei segmenti per l'euristica di A*
+        self.starts = np.array([seg.points[0] for seg in segments], dtype=float).reshape(n, 2)
+        self.ends = np.array([seg.points[-1] for seg in segments], dtype=float).reshape(n, 2)
+
+        # Fattore metri -> unità di costo per l'euristica (0 = nessuna euristica)
+        if profile == "length":
+            self.heuristic_scale = 1.0
+        elif profile == "time" and n > 0:
+            self.heuristic_scale = 1.0 / max(seg.max_speed for seg in segments)
+        else:
+            self.heuristic_scale = 0.0
+
+        # Copie come liste Python: nel loop di ricerca sono molto più veloci degli array
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._weights = self.weights.tolist()
+        self._starts = self.starts.tolist()
+        self._ends = self.ends.tolist()
+
+    def neighbors(self, i):
+        a, b = self._indptr[i], self._indptr[i+1]
+        return zip(self._indices[a:b], self._weights[a:b])
+
+    def a_star(self, start, target):
+        """Percorso di costo minimo start -> target (lista di indici, [] se non esiste)"""
+        tx, ty = self._starts[target]
+        target_weight = float(self.node_weights[target])
+        scale = self.heuristic_scale
+        ends = self._ends
+
+        def h(i):
+            # Distanza in linea d'aria fino all'inizio del target + il target stesso
+            if i == target:
+                return 0.0
+            x, y = ends[i]
+            return scale*hypot(tx - x, ty - y) + target_weight
+
+        best = {start: 0.0}
+        parent = {start: None}
+        queue = [(h(start), 0.0, start)]
+        while queue:
+            _, cost, current = heapq.heappop(queue)
+            if cost > best[current]:
+                continue  # voce superata da un costo migliore
+            if current == target:
+                return self._reconstruct(parent, target)
+            for neighbor, weight in self.neighbors(current):
+                new_cost = cost + weight
+                if new_cost < best.get(neighbor, float("inf")):
+                    best[neighbor] = new_cost
+                    parent[neighbor] = current
+                    heapq.heappush(queue, (new_cost + h(neighbor), new_cost, neighbor))
+        return []
+
+    def dijkstra(self, start, targets):
+        """Percorsi minimi da start verso tutti i target con una sola ricerca: {target: percorso}"""
+        remaining = set(targets)
+        best = {start: 0.0}
+        parent = {start: None}
+        paths = {}
+        queue = [(0.0, start)]
+        while queue and remaining:
+            cost, current = heapq.heappop(queue)
+            if cost > best[current]:
+                continue
+            if current in remaining:
+                remaining.discard(current)
+                paths[current] = self._reconstruct(parent, current)
+            for neighbor, weight in self.neighbors(current):
+                new_cost = cost + weight
+                if new_cost < best.get(neighbor, float("inf")):
+                    best[neighbor] = new_cost
+                    parent[neighbor] = current
+                    heapq.heappush(queue, (new_cost, neighbor))
+        for target in remaining:
+            paths[target] = []
+        return paths
+
+    @staticmethod
+    def _reconstruct(parent, node):
+        path = []
+        while node is not None:
+            path.append(node)
+            node = parent[node]
+        path.reverse()
+        return path
+
+
+class Router:
+    """Calcolo percorsi per una simulazione, con cache LRU dei risultati.
+
+    I percorsi sono memorizzati per (inizio, fine, profilo di peso); grafo e
+    cache vengono scartati automaticamente quando la topologia cambia.
+    """
+
+    def __init__(self, sim, cache_size=4096):
+        self.sim = sim
+        self.cache_size = cache_size
+        self._graphs = {}  # {profilo: RoutingGraph}
+        self._cache = OrderedDict()  # {(inizio, fine, profilo): percorso}
+        self._version = None
+
+    def _sync(self):
+        """Scarta grafi e cache se la topologia è cambiata dall'ultimo uso"""
+        topology = self.sim.topology
+        if topology.version != self._version:
+            self._graphs.clear()
+            self._cache.clear()
+            self._version = topology.version
+
+    def graph(self, profile="length"):
+        self._sync()
+        topology = self.sim.topology
+        if profile not in self._graphs:
+            self._graphs[profile] = RoutingGraph(self.sim.segments, topology, profile)
+        return self._graphs[profile]
+
+    def share_with(self, sim):
+        """Router per un'altra simulazione con la stessa rete: grafi e cache sono condivisi"""
+        # Versione allineata prima della copia: altrimenti (es. rete modello che non ha mai
+        # calcolato percorsi) ogni copia svuoterebbe grafi e cache condivisi al primo uso
+        self._sync()
+        router = Router(sim, self.cache_size)
+        router._graphs = self._graphs
+        router._cache = self._cache
+        router._version = self._version
+        return router
+
+    def _remember(self, key, path):
+        self._cache[key] = path
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def route(self, start, end, profile="length"):
+        """Percorso minimo tra due indici di segmento (lista di indici, [] se non esiste)"""
+        graph = self.graph(profile)
+        key = (start, end, profile)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+        else:
+            self._remember(key, graph.a_star(start, end))
+        return list(self._cache[key])
+
+    def routes_from(self, start, ends, profile="length"):
+        """Percorsi minimi da un'origine verso più destinazioni: {fine: percorso}"""
+        graph = self.graph(profile)
+        missing = [end for end in ends if (start, end, profile) not in self._cache]
+        if missing:
+            for end, path in graph.dijkstra(start, missing).items():
+                self._remember((start, end, profile), path)
+        return {end: self.route(start, end, profile) for end in ends}
@@ -0,0 +1,64 @@
+from itertools import count
+import heapq
+
+# Tolleranza sui tempi: un evento dovuto a 5.0 s scatta anche se il tempo
+# accumulato sommando dt vale 4.9999999999
+EPSILON = 1e-9
+
+
+class EventScheduler:
+    """Calendario di eventi ordinato per tempo di simulazione (coda di priorità).
+
+    Ogni passo la simulazione chiama run_until(t): il costo è proporzionale
+    agli eventi che scattano davvero, non al numero di oggetti che li generano.
+    """
+
+    def __init__(self):
+        self._queue = []  # [[tempo, progressivo, callback, args]]; callback None = annullato
+        self._counter = count()
+        self.now = 0.0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def schedule(self, time, callback, *args):
+        """Programma callback(*args) al tempo `time`; restituisce l'evento (vedi cancel)"""
+        event = [time, next(self._counter), callback, args]
+        heapq.heappush(self._queue, event)
+        return event
+
+    @staticmethod
+    def cancel(event):
+        """Annulla un evento restituito da schedule (resta in coda ma non scatta)"""
+        event[2] = None
+
+    def run_until(self, time):
+        """Esegue, in ordine, tutti gli eventi con tempo <= time.
+
+        Gli eventi programmati durante l'esecuzione per un tempo <= time
+        scattano alla chiamata successiva: ogni oggetto reagisce al massimo
+        una volta per passo.
+        """
+        self.now = time
+        queue = self._queue
+        due = []
+        while queue and queue[0][0] <= time + EPSILON:
+            due.append(heapq.heappop(queue))
+        for _, _, callback, args in due:
+            if callback is not None:
+                callback(*args)
+
+    def clear(self):
+        self._queue.clear()
+
+    def get_state(self):
+        """(now, prossimo progressivo, eventi in coda) per salvare il calendario (vedi set_state)"""
+        next_seq = next(self._counter)
+        self._counter = count(next_seq)
+        return self.now, next_seq, list(self._queue)
+
+    def set_state(self, state):
+        now, next_seq, queue = state
+        self.now = now
+        self._queue = list(queue)  # copia di una lista già ordinata come heap
+        self._counter = count(next_seq)
@@ -0,0 +1,157 @@
+"""Statistiche di traffico per segmento calcolate durante la simulazione.
+
+    stats = sim.enable_statistics(window=300, sink=CsvSink("stats.csv"))
+    sim.run(864000)
+    stats.flush(sim)   # emette la finestra parziale in corso
+
+Ogni segmento ha un accumulatore (segment.stats) aggiornato nel ciclo dei veicoli:
+veicoli·secondi, veicoli·metri, ingressi e uscite, media e varianza della velocità
+(algoritmo di Welford) e grammi di CO2. Alla fine di ogni finestra di aggregazione le
+righe dei segmenti con traffico vengono passate al sink e gli accumulatori azzerati:
+la memoria usata non dipende dalla durata della simulazione.
+"""
+import csv
+from math import sqrt
+
+from .scheduler import EPSILON
+
+
+class SegmentAccumulator:
+    """Accumulatori di un segmento per la finestra corrente"""
+    __slots__ = ('vehicle_seconds', 'vehicle_metres', 'entries', 'exits', 'samples',
+                 'speed_mean', 'speed_m2', 'co2_grams')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.vehicle_seconds = 0.0
+        self.vehicle_metres = 0.0
+        self.entries = 0
+        self.exits = 0
+        self.samples = 0       # campioni di velocità (uno per veicolo per passo)
+        self.speed_mean = 0.0
+        self.speed_m2 = 0.0    # somma dei quadrati degli scarti (Welford)
+        self.co2_grams = 0.0
+
+    def sample(self, v, distance, co2_emissions, dt):
+        """Un veicolo per un passo: velocità v, metri percorsi, emissioni istantanee in g/km"""
+        self.vehicle_seconds += dt
+        self.vehicle_metres += distance
+        self.co2_grams += co2_emissions * distance / 1000
+        self.samples += 1
+        delta = v - self.speed_mean
+        self.speed_mean += delta / self.samples
+        self.speed_m2 += delta * (v - self.speed_mean)
+
+    def merge(self, count, seconds, metres, co2_grams, mean, m2):
+        """Aggiunge un gruppo di campioni già riassunto (motore vettoriale, algoritmo di Chan)"""
+        self.vehicle_seconds += seconds
+        self.vehicle_metres += metres
+        self.co2_grams += co2_grams
+        total = self.samples + count
+        delta = mean - self.speed_mean
+        self.speed_mean += delta * count / total
+        self.speed_m2 += m2 + delta * delta * self.samples * count / total
+        self.samples = total
+
+
+class SegmentStatistics:
+    """Raccoglie le statistiche dei segmenti di una simulazione a finestre fisse.
+
+    - window: durata di una finestra di aggregazione (secondi di simulazione)
+    - sink: callable(righe) chiamato a fine finestra con una lista di dict, uno per
+      segmento con traffico (vedi row)
+    """
+
+    def __init__(self, window, sink):
+        if window <= 0:
+            raise ValueError(f"Statistics window must be positive (got {window}).")
+        self.window = window
+        self.sink = sink
+        self.window_start = 0.0
+        self.windows_emitted = 0
+
+    def attach(self, sim):
+        """Crea gli accumulatori dei segmenti di `sim` e apre la prima finestra"""
+        for segment in sim.segments:
+            if segment.stats is None:
+                segment.stats = SegmentAccumulator()
+        self.window_start = sim.t
+
+    def detach(self, sim):
+        for segment in sim.segments:
+            segment.stats = None
+
+    def end_step(self, sim):
+        """Chiamato da Simulation.update alla fine di ogni passo: chiude le finestre scadute"""
+        if sim.t >= self.window_start + self.window - EPSILON:
+            self.flush(sim)
+
+    def flush(self, sim):
+        """Emette la finestra corrente (anche se incompleta) e ne apre una nuova"""
+        window_end = sim.t
+        duration = window_end - self.window_start
+        rows = []
+        for index, segment in enumerate(sim.segments):
+            acc = segment.stats
+            if acc is None:
+                continue
+            if acc.samples or acc.entries or acc.exits:
+                rows.append(self.row(index, segment, acc, duration))
+            acc.reset()
+        for row in rows:
+            row["window_start"] = self.window_start
+            row["window_end"] = window_end
+        if rows:
+            self.sink(rows)
+        self.window_start = window_end
+        self.windows_emitted += 1
+
+    @staticmethod
+    def row(index, segment, acc, duration):
+        """
+        Riga di un segmento per una finestra di `duration` secondi:
+        - flow: veicoli usciti all'ora
+        - density: veicoli presenti in media per km
+        - space_mean_speed: veicoli·metri / veicoli·secondi (m/s)
+        - speed_mean, speed_std: media e deviazione standard dei campioni di velocità
+        """
+        length_km = max(segment.get_length(), 1e-6) / 1000
+        seconds = float(acc.vehicle_seconds)
+        metres = float(acc.vehicle_metres)
+        return {
+            "segment": index,
+            "segment_id": segment.id_segment,
+            "entries": acc.entries,
+            "exits": acc.exits,
+            "vehicle_seconds": seconds,
+            "vehicle_metres": metres,
+            "flow": acc.exits * 3600 / duration if duration > 0 else 0.0,
+            "density": seconds / duration / length_km if duration > 0 else 0.0,
+            "space_mean_speed": metres / seconds if seconds else 0.0,
+            "speed_mean": float(acc.speed_mean),
+            "speed_std": sqrt(acc.speed_m2 / (acc.samples - 1)) if acc.samples > 1 else 0.0,
+            "co2_grams": float(acc.co2_grams),
+        }
+
+
+class CsvSink:
+    """Sink che aggiunge le righe di ogni finestra a un file CSV"""
+
+    COLUMNS = ("window_start", "window_end", "segment", "segment_id", "entries", "exits",
+               "vehicle_seconds", "vehicle_metres", "flow", "density", "space_mean_speed",
+               "speed_mean", "speed_std", "co2_grams")
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.COLUMNS)
+        self._writer.writeheader()
+
+    def __call__(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -7,12 +7,22 @@ from .geometry.quadratic_curve import QuadraticCurve
 from .geometry.cubic_curve import CubicCurve
 from .geometry.segment import Segment
 from .vehicle import Vehicle
-from scipy.spatial import distance
-import heapq # Per l'algoritmo di Dijkstra
+from .vehicle_engine import VehicleEngine
+from .barrier_index import BarrierIndex
+from .topology import Topology
+from .routing import Router
+from .scheduler import EventScheduler
+from .profiler import Profiler
+from .segment_stats import SegmentAccumulator, SegmentStatistics
+from . import state
+from collections import deque
+from time import perf_counter_ns
+import copy
+import numpy as np
 
 
 class Simulation:
-    def __init__(self):
+    def __init__(self, engine="scalar"):
         self.segments = []
         self.vehicles = {}
         self.vehicle_generator = []
@@ -20,22 +30,194 @@ class Simulation:
         self.obstacles = []
         self.intersections = []
         self.traffic_lights = []
+        # Indici per lookup O(1): segmento -> indice, indice -> incrocio
+        self.segment_indices = {}         # {segmento: indice in self.segments}
+        self.incoming_intersections = {}  # {indice segmento: incrocio a cui arriva}
+        self.outgoing_intersections = {}  # {indice segmento: incrocio da cui parte}
+        # Grafo delle connessioni, aggiornato ad ogni add_segment
+        self.topology = Topology()
+        self.router = Router(self)
+        # Barriere (ostacoli attivi e semafori rossi) indicizzate per segmento
+        self.barrier_index = BarrierIndex()
+        # Indici dei segmenti con almeno un veicolo: gli unici visitati ad ogni passo
+        self.active_segments = set()
+        # Calendari degli eventi: cambi dei semafori e ostacoli (inizio passo),
+        # tentativi dei generatori (fine passo)
+        self.events = EventScheduler()
+        self.spawn_events = EventScheduler()
+
+        # Veicoli: ID interi densi, riusati dopo che un veicolo ha finito il percorso
+        self.next_vehicle_id = 0
+        self.free_vehicle_ids = []
+        self.vehicles_spawned = 0
+        self.vehicles_finished = 0
+        self.on_trip_end = None  # callback(riepilogo) chiamata per ogni veicolo arrivato a destinazione
+        self.recorder = None     # Recorder: se presente registra lo stato alla fine di ogni passo
+        self.profiler = None     # Profiler: se presente misura i tempi delle fasi di update
+        self.statistics = None   # SegmentStatistics: statistiche per segmento a finestre (enable_statistics)
 
         self.t = 0.0
         self.frame_count = 0
         self.dt = 1/60  
 
+        # Motore di aggiornamento veicoli: "scalar" (un Vehicle.update per veicolo)
+        # oppure "vectorized" (array NumPy, vedi VehicleEngine)
+        self.engine_mode = engine
+        if engine == "scalar":
+            self.engine = None
+        elif engine == "vectorized":
+            self.engine = VehicleEngine()
+        else:
+            raise ValueError(f"Unknown engine '{engine}' (expected 'scalar' or 'vectorized').")
+
+    def copy_network(self):
+        """
+        Restituisce una nuova simulazione senza veicoli, generatori, semafori e ostacoli
+        che condivide con questa la rete stradale: geometria dei segmenti, topologia,
+        grafo e cache dei percorsi, incroci e oggetti statici.
+        La rete condivisa va considerata immutabile (non aggiungere segmenti alle copie).
+        """
+        sim = Simulation(engine=self.engine_mode)
+        sim.dt = self.dt
+
+        # Segmenti: stessa geometria (liste e tabelle condivise), code di veicoli nuove
+        for seg in self.segments:
+            clone = copy.copy(seg)
+            clone.vehicles = deque()
+            clone.stats = None
+            sim.segment_indices[clone] = len(sim.segments)
+            sim.segments.append(clone)
+        sim.topology = self.topology
+        sim.router = self.router.share_with(sim)
+        sim.static_objects = list(self.static_objects)
+
+        # Incroci: stesse mappe di precedenza/stop, strade della nuova simulazione
+        clones = {}
+        for inter in self.intersections:
+            clone = copy.copy(inter)
+            clone.sim = sim
+            clone.incoming_roads = [sim.segments[self.index_of(road)] for road in inter.incoming_roads]
+            clone.outgoing_roads = [sim.segments[self.index_of(road)] for road in inter.outgoing_roads]
+            clone.paths = {road_in: {road_out: sim.segments[self.index_of(seg)] for road_out, seg in outs.items()}
+                           for road_in, outs in inter.paths.items()}
+            clone.stopped_vehicles = set()
+            clone.approaches = {}
+            clone._approaches_frame = None
+            clones[inter] = clone
+            sim.intersections.append(clone)
+        sim.incoming_intersections = {i: clones[inter] for i, inter in self.incoming_intersections.items()}
+        sim.outgoing_intersections = {i: clones[inter] for i, inter in self.outgoing_intersections.items()}
+        return sim
 
     def add_vehicle(self, veh):
+        if self.free_vehicle_ids:
+            veh.id = self.free_vehicle_ids.pop()
+        else:
+            veh.id = self.next_vehicle_id
+            self.next_vehicle_id += 1
+        veh.spawn_time = self.t
         self.vehicles[veh.id] = veh
+        self.vehicles_spawned += 1
+        if self.engine is not None:
+            self.engine.attach(veh)
         if len(veh.path) > 0:
-            self.segments[veh.path[0]].add_vehicle(veh)
+            first = self.segments[veh.path[0]]
+            first.add_vehicle(veh)
+            self.active_segments.add(veh.path[0])
+            if first.stats is not None:
+                first.stats.entries += 1
+
+    def _retire_vehicle(self, veh):
+        """Toglie dalla simulazione un veicolo che ha finito il percorso e ne libera l'ID"""
+        del self.vehicles[veh.id]
+        if self.engine is not None:
+            self.engine.detach(veh)
+        self.vehicles_finished += 1
+        if self.on_trip_end:
+            self.on_trip_end({
+                "id": veh.id,
+                "vehicle_class": veh.vehicle_class,
+                "engine_type": veh.engine_type,
+                "origin": veh.path[0],
+                "destination": veh.path[-1],
+                "start_time": veh.spawn_time,
+                "end_time": self.t,
+                "travel_time": self.t - veh.spawn_time,
+                "distance": sum(self.segments[i].get_length() for i in veh.path),
+            })
+        self.free_vehicle_ids.append(veh.id)
 
     def add_segment(self, seg):
+        self.segment_indices[seg] = len(self.segments)
         self.segments.append(seg)
+        if self.statistics is not None:
+            seg.stats = SegmentAccumulator()
+        self.topology.add_segment(len(self.segments) - 1, seg)
+
+    def add_segments(self, segments, adjacency=None):
+        """
+        Aggiunge più segmenti in blocco.
+        adjacency: (indptr, indices) in formato CSR con i successori di TUTTI i segmenti della
+        rete dopo l'aggiunta (es. da una cache compilata): la topologia non viene ricalcolata.
+        """
+        for seg in segments:
+            self.segment_indices[seg] = len(self.segments)
+            self.segments.append(seg)
+            if self.statistics is not None:
+                seg.stats = SegmentAccumulator()
+            if adjacency is None:
+                self.topology.add_segment(len(self.segments) - 1, seg)
+        if adjacency is not None:
+            self.topology.restore(self.segments, *adjacency)
+
+    def index_of(self, segment):
+        """Indice del segmento in self.segments (O(1), ValueError se assente)"""
+        try:
+            return self.segment_indices[segment]
+        except KeyError:
+            raise ValueError(f"Segment {segment.id_segment} not found in simulation.") from None
+
+    def register_intersection_road(self, inter, segment, incoming=True):
+        """Registra il segmento come strada entrante/uscente dell'incrocio"""
+        index = self.index_of(segment)
+        # Se una strada appartiene a più incroci vale il primo registrato
+        if incoming:
+            self.incoming_intersections.setdefault(index, inter)
+        else:
+            self.outgoing_intersections.setdefault(index, inter)
+        return index
 
     def add_vehicle_generator(self, gen):
         self.vehicle_generator.append(gen)
+        self._schedule_generator(gen, gen.last_added_time + gen.period)
+
+    def _schedule_generator(self, gen, time):
+        gen.next_attempt = time
+        gen.event = self.spawn_events.schedule(time, self._run_generator, gen)
+
+    def set_vehicle_rate(self, gen, vehicle_rate):
+        """
+        Cambia il ritmo di un generatore già aggiunto, con effetto immediato: il prossimo
+        tentativo è period secondi dopo l'ultimo veicolo generato (o al passo successivo,
+        se sono già passati). Assegnare gen.vehicle_rate vale solo dal tentativo successivo.
+        """
+        gen.vehicle_rate = vehicle_rate
+        if gen.event is not None:
+            self.spawn_events.cancel(gen.event)
+        self._schedule_generator(gen, max(gen.last_added_time + gen.period, self.t))
+
+    def _run_generator(self, gen):
+        if self.profiler is not None:
+            start = perf_counter_ns()
+            spawned = gen.try_spawn(self)
+            self.profiler.add(self.profiler.generators, gen, perf_counter_ns() - start)
+        else:
+            spawned = gen.try_spawn(self)
+        if spawned:
+            self._schedule_generator(gen, gen.last_added_time + gen.period)
+        else:
+            # Nessuno spazio all'inizio della strada: riprova al passo successivo
+            self._schedule_generator(gen, self.t + self.dt)
 
     def create_vehicle(self, **kwargs):
         veh = Vehicle(kwargs)
@@ -54,6 +236,86 @@ class Simulation:
         cur = CubicCurve(start, control_1, control_2, end, **kwargs)
         self.add_segment(cur)
 
+    # --- Costruzione in blocco (array NumPy o liste) ---
+
+    @staticmethod
+    def _per_segment(value, n):
+        """Valore unico ripetuto per n segmenti, oppure una sequenza di n valori"""
+        if value is None or isinstance(value, str) or np.ndim(value) == 0:
+            return [value.item() if hasattr(value, "item") else value]*n
+        values = value.tolist() if hasattr(value, "tolist") else list(value)
+        if len(values) != n:
+            raise ValueError(f"Expected {n} values, got {len(values)}.")
+        return values
+
+    def _add_batch(self, segments):
+        first = len(self.segments)
+        self.add_segments(segments)
+        return range(first, len(self.segments))
+
+    def create_segments(self, starts, ends, category="general", max_speed=50, ids=None):
+        """
+        Crea in blocco segmenti rettilinei da array (n, 2) di punti iniziali e finali.
+        category, max_speed, ids: valore unico o uno per segmento.
+        Restituisce gli indici dei nuovi segmenti (consecutivi, nell'ordine degli array).
+        """
+        points = np.stack((np.asarray(starts, dtype=float).reshape(-1, 2),
+                           np.asarray(ends, dtype=float).reshape(-1, 2)), axis=1)
+        n = len(points)
+        return self._add_batch(Segment.batch_from_points(
+            points, self._per_segment(category, n), self._per_segment(max_speed, n), self._per_segment(ids, n)))
+
+    def create_quadratic_bezier_curves(self, starts, controls, ends, category="general", max_speed=50, ids=None):
+        """Come create_segments, per curve quadratiche (array (n, 2) di inizio, controllo e fine)"""
+        n = len(starts)
+        return self._add_batch(QuadraticCurve.batch(
+            starts, controls, ends,
+            self._per_segment(category, n), self._per_segment(max_speed, n), self._per_segment(ids, n)))
+
+    def create_cubic_bezier_curves(self, starts, controls_1, controls_2, ends, category="general", max_speed=50, ids=None):
+        """Come create_segments, per curve cubiche (array (n, 2) di inizio, due controlli e fine)"""
+        n = len(starts)
+        return self._add_batch(CubicCurve.batch(
+            starts, controls_1, controls_2, ends,
+            self._per_segment(category, n), self._per_segment(max_speed, n), self._per_segment(ids, n)))
+
+    def connect_intersections(self, table, build=True):
+        """
+        Collega in blocco strade e incroci da una tabella di indici, una riga per collegamento:
+        (indice dell'incrocio in self.intersections, indice del segmento, ruolo) con ruolo
+        "in" (strada entrante), "out" (strada uscente) o "stop" (strada entrante con STOP).
+        Con build=True crea poi i raccordi interni e calcola le precedenze degli incroci coinvolti.
+        """
+        stops = {}
+        touched = []
+        for inter_index, segment_index, role in table:
+            inter = self.intersections[int(inter_index)]
+            segment = self.segments[int(segment_index)]
+            if inter not in stops:
+                stops[inter] = []
+                touched.append(inter)
+            if role == "in":
+                inter.add_incoming(segment)
+            elif role == "out":
+                inter.add_outgoing(segment)
+            elif role == "stop":
+                inter.add_incoming(segment)
+                stops[inter].append(segment)
+            else:
+                raise ValueError(f"Unknown intersection role '{role}' (expected 'in', 'out' or 'stop').")
+
+        if build:
+            for inter in touched:
+                inter.build()
+                for segment in stops[inter]:
+                    inter.add_stop_sign(segment)
+                inter.calculate_priorities()
+        else:
+            for inter in touched:
+                for segment in stops[inter]:
+                    inter.add_stop_sign(segment)
+        return touched
+
     def create_vehicle_generator(self, **kwargs):
         # Se nella configurazione ci sono veicoli definiti, controlliamo se serve calcolare il percorso
         if 'vehicles' in kwargs:
@@ -76,16 +338,69 @@ class Simulation:
         obj = StaticObject(x, y, width, height, color, shape)
         self.static_objects.append(obj)
 
-    def create_obstacle(self, segment_id, position, duration):
+    def create_obstacle(self, segment_id, position, duration, delay=0):
         # segment_id è l'indice numerico del segmento nella lista self.segments
+        # delay: secondi prima che l'ostacolo compaia sulla strada
         obs = Obstacle(segment_id, position, duration)
+        if delay > 0:
+            obs.active = False
+            self.events.schedule(self.t + delay, self._activate_obstacle, obs, self.t + delay)
+        else:
+            self._activate_obstacle(obs, self.t)
+        return obs
+
+    def _activate_obstacle(self, obs, time):
+        obs.active = True
         self.obstacles.append(obs)
+        self.barrier_index.add(obs)
+        obs.expires_at = time + obs.duration
+        self.events.schedule(obs.expires_at, self._expire_obstacle, obs)
+
+    def _expire_obstacle(self, obs):
+        obs.active = False
+        obs.time_elapsed = obs.duration
+        self.obstacles.remove(obs)
+        self.barrier_index.remove(obs)
     
     def create_traffic_light(self, segment_id, position, cycle_time=5, initial_state="red"):
         # Passiamo initial_state al costruttore di TrafficLight
         tl = TrafficLight(segment_id, position, cycle_time, initial_state)
         self.traffic_lights.append(tl)
+        tl.on_toggle = self._on_light_toggle
+        if tl.is_active:
+            self.barrier_index.add(tl)
+        self._schedule_light(tl, self.t)
         return tl
+
+    def _schedule_light(self, tl, now):
+        tl.next_switch = now + tl.cycle_time - tl.time_elapsed
+        tl.event = self.events.schedule(tl.next_switch, self._switch_light, tl)
+
+    def set_cycle_time(self, tl, cycle_time):
+        """
+        Cambia la durata del ciclo di un semaforo già aggiunto, con effetto sul ciclo in corso:
+        il prossimo cambio di stato è cycle_time secondi dopo l'ultimo (o al passo successivo,
+        se sono già passati). Assegnare tl.cycle_time vale solo dal cambio di stato successivo.
+        """
+        last_switch = tl.next_switch - tl.cycle_time
+        tl.cycle_time = cycle_time
+        tl.time_elapsed = 0
+        if tl.event is not None:
+            self.events.cancel(tl.event)
+        tl.next_switch = max(last_switch + cycle_time, self.t)
+        tl.event = self.events.schedule(tl.next_switch, self._switch_light, tl)
+
+    def _switch_light(self, tl):
+        tl.time_elapsed = 0
+        tl.toggle_state()
+        self._schedule_light(tl, self.events.now)
+
+    def _on_light_toggle(self, tl):
+        # Un semaforo ROSSO è una barriera, uno VERDE no
+        if tl.is_active:
+            self.barrier_index.add(tl)
+        else:
+            self.barrier_index.remove(tl)
     
     def create_intersection(self, x, y, id_inter="", size=20):
         # Nota: Non passiamo più **kwargs per ora per semplicità
@@ -97,112 +412,60 @@ class Simulation:
         for _ in range(steps):
             self.update()
 
+    def invalidate_topology(self):
+        """Da chiamare se si modificano i punti di segmenti già aggiunti"""
+        self.topology.rebuild(self.segments)
+
     def _build_topology(self):
         """
-        Costruisce il grafo delle connessioni tra segmenti basandosi sulla geometria.
+        Espone il grafo delle connessioni tra segmenti (mantenuto da self.topology).
         Due segmenti sono connessi se la fine di uno coincide con l'inizio dell'altro.
         """
-        self.adjacency_list = {i: [] for i in range(len(self.segments))}
-        self.segment_id_map = {} # Mappa da ID stringa a indice numerico
-
-        # 1. Costruisci la mappa degli ID
-        for i, seg in enumerate(self.segments):
-            if hasattr(seg, 'id_segment') and seg.id_segment:
-                self.segment_id_map[seg.id_segment] = i
-        
-        # 2. Trova le connessioni (N^2, ma ok per simulazioni piccole)
-        # Tolleranza di 0.1 metri per considerare i punti "uniti"
-        tolerance = 0.5 
-        
-        for i, seg_a in enumerate(self.segments):
-            end_point = seg_a.points[-1]
-            
-            for j, seg_b in enumerate(self.segments):
-                if i == j: continue # Non collegarsi a se stessi
-                
-                start_point = seg_b.points[0]
-                dist = distance.euclidean(end_point, start_point)
-                
-                if dist < tolerance:
-                    self.adjacency_list[i].append(j)
+        self.adjacency_list = self.topology.successors
+        self.segment_id_map = self.topology.id_map # Mappa da ID stringa a indice numerico
     
-    def find_shortest_path(self, start_id, end_id):
+    def _segment_index_by_id(self, segment_id, role="Start"):
+        # La topologia è già aggiornata in modo incrementale da add_segment
+        self._build_topology()
+        if segment_id not in self.segment_id_map:
+            raise ValueError(f"{role} segment ID '{segment_id}' not found.")
+        return self.segment_id_map[segment_id]
+
+    def find_shortest_path(self, start_id, end_id, profile="length"):
         """
         Trova il percorso più breve tra due segmenti usando i loro ID stringa.
         Restituisce una lista di indici [idx1, idx2, idx3...]
+        profile: "length" (metri), "time" (tempo a velocità massima) o "hops" (numero di segmenti)
         """
-        # Costruiamo la topologia se non esiste o se sono stati aggiunti segmenti
-        # Nota: per efficienza potresti farlo solo una volta alla fine della creazione
-        self._build_topology()
-
-        if start_id not in self.segment_id_map:
-            raise ValueError(f"Start segment ID '{start_id}' not found.")
-        if end_id not in self.segment_id_map:
-            raise ValueError(f"End segment ID '{end_id}' not found.")
-
-        start_idx = self.segment_id_map[start_id]
-        end_idx = self.segment_id_map[end_id]
-
-        # Dijkstra Algorithm
-        # coda: (costo, nodo_corrente, percorso_fino_a_qui)
-        queue = [(0, start_idx, [])]
-        visited = set()
-        
-        while queue:
-            (cost, current_idx, path) = heapq.heappop(queue)
-            
-            if current_idx in visited:
-                continue
-            visited.add(current_idx)
-
-            # Percorso aggiornato
-            path = path + [current_idx]
+        start_idx = self._segment_index_by_id(start_id, "Start")
+        end_idx = self._segment_index_by_id(end_id, "End")
 
-            # Trovato!
-            if current_idx == end_idx:
-                return path
+        # A* sul grafo congelato del router (con cache LRU dei percorsi)
+        path = self.router.route(start_idx, end_idx, profile)
+        if not path:
+            print(f"Nessun percorso trovato tra {start_id} e {end_id}")
+        return path
 
-            # Esplora vicini
-            for neighbor in self.adjacency_list[current_idx]:
-                if neighbor not in visited:
-                    # Il costo è la lunghezza del segmento (cerchiamo il percorso più corto in metri)
-                    # Oppure 1 (per il minor numero di segmenti)
-                    weight = self.segments[neighbor].get_length()
-                    heapq.heappush(queue, (cost + weight, neighbor, path))
-
-        print(f"Nessun percorso trovato tra {start_id} e {end_id}")
-        return []
+    def find_shortest_paths(self, start_id, end_ids, profile="length"):
+        """
+        Percorsi più brevi da un segmento verso più destinazioni con una sola ricerca.
+        Restituisce {end_id: [idx1, idx2, ...]} (lista vuota se non raggiungibile)
+        """
+        start_idx = self._segment_index_by_id(start_id, "Start")
+        end_indices = {end_id: self._segment_index_by_id(end_id, "End") for end_id in end_ids}
+        paths = self.router.routes_from(start_idx, list(end_indices.values()), profile)
+        return {end_id: paths[end_idx] for end_id, end_idx in end_indices.items()}
     
-    def update(self):
-        # 1. Aggiorna ostacoli e semafori
-        for obs in self.obstacles:
-            obs.update(self.dt)
-        for tl in self.traffic_lights:
-            tl.update(self.dt)
-            
-        # Rimuovi ostacoli scaduti (ma non i semafori, quelli restano!)
-        self.obstacles = [obs for obs in self.obstacles if obs.active]
-
-        # 2. Aggiorna veicoli
-        for segment_index, segment in enumerate(self.segments):
-            # Troviamo gli ostacoli su questo segmento
-            obs_on_segment = [obs for obs in self.obstacles if obs.segment_id == segment_index]
-            
-            # Troviamo i semafori ROSSI su questo segmento
-            lights_on_segment = [tl for tl in self.traffic_lights if tl.segment_id == segment_index and tl.is_active]
-            
-            # Uniamo tutto ciò che blocca la strada in un'unica lista "barriere"
-            # Entrambi gli oggetti (Obstacle e TrafficLight) hanno 'x' e devono essere trattati come fermi.
-            barriers = obs_on_segment + lights_on_segment
-            
+    def _update_vehicles(self):
+        """Aggiorna i veicoli uno alla volta con Vehicle.update (motore scalare)"""
+        prof = self.profiler
+        dt = self.dt
+        for segment_index in sorted(self.active_segments):
+            segment = self.segments[segment_index]
+            stats = segment.stats
             # --- NUOVO: Rilevamento Incrocio e Precedenza ---
             # Cerchiamo se questo segmento fa parte di un incrocio come "incoming"
-            parent_intersection = None
-            for inter in self.intersections:
-                # Usiamo l'oggetto segmento per trovarlo
-                if segment in inter.incoming_roads:
-                    parent_intersection = inter
-                    break
+            parent_intersection = self.incoming_intersections.get(segment_index)
             
             intersection_barrier = None
             
@@ -216,7 +479,14 @@ class Simulation:
                     
                     if dist_to_end < 15:
                         # Chiediamo all'incrocio se è libero
-                        is_clear = parent_intersection.check_clearance(vehicle, segment_index)
+                        if prof is not None:
+                            start = perf_counter_ns()
+                            is_clear = parent_intersection.check_clearance(vehicle, segment_index)
+                            elapsed = perf_counter_ns() - start
+                            prof.add(prof.phases, "vehicles.intersections", elapsed)
+                            prof.add(prof.intersections, parent_intersection.id, elapsed)
+                        else:
+                            is_clear = parent_intersection.check_clearance(vehicle, segment_index)
                         
                         if not is_clear:
                             # Creiamo una barriera virtuale alla fine della strada
@@ -237,6 +507,9 @@ class Simulation:
 
                 # --- FINE NUOVO ---
 
+                if prof is not None:
+                    start = perf_counter_ns()
+
                 # Calcolo Lead (chi sta davanti)
                 lead = None
                 
@@ -244,30 +517,34 @@ class Simulation:
                 if i > 0:
                     lead = self.vehicles[segment.vehicles[i-1]]
                 
-                # 2. Barriere Fisiche (Semafori/Ostacoli) - Codice precedente
+                # 2. Barriere Fisiche (Semafori/Ostacoli): la più vicina davanti al muso
+                # (Obstacle e TrafficLight hanno 'x', 'v' e 'l' e sono trattati come fermi)
                 vehicle_front_pos = vehicle.x + vehicle.l
-                relevant_barriers = [b for b in barriers if b.x > vehicle_front_pos]
+                closest_barrier = self.barrier_index.nearest_ahead(segment_index, vehicle_front_pos)
                 
                 # 3. Barriera Virtuale Incrocio (Precedenza/Stop)
-                # Se esiste ed è davanti al muso, la aggiungiamo
+                # Se esiste ed è davanti al muso (e più vicina), la usiamo
                 if intersection_barrier and intersection_barrier.x > vehicle_front_pos:
-                    relevant_barriers.append(intersection_barrier)
+                    if closest_barrier is None or intersection_barrier.x < closest_barrier.x:
+                        closest_barrier = intersection_barrier
 
-                # Trova la barriera più vicina
-                if relevant_barriers:
-                    closest_barrier = min(relevant_barriers, key=lambda b: b.x)
-                    
-                    # Logica stop line (l = vehicle.l) se non settata
-                    if not hasattr(closest_barrier, 'v'): closest_barrier.v = 0
-                    if not hasattr(closest_barrier, 'l'): closest_barrier.l = 0
-                    
+                if closest_barrier:
                     if lead:
                         if closest_barrier.x < lead.x:
                             lead = closest_barrier
                     else:
                         lead = closest_barrier
 
-                vehicle.update(lead, self.dt)
+                x_before = vehicle.x
+                if prof is not None:
+                    middle = perf_counter_ns()
+                    vehicle.update(lead, dt)
+                    prof.add(prof.phases, "vehicles.barriers", middle - start)
+                    prof.add(prof.phases, "vehicles.idm", perf_counter_ns() - middle)
+                else:
+                    vehicle.update(lead, dt)
+                if stats is not None:
+                    stats.sample(vehicle.v, vehicle.x - x_before, vehicle.co2_emissions, dt)
                 
                 # Pulizia per veicoli che hanno superato l'incrocio: rimuovere da "stopped_vehicles"
                 if parent_intersection and vehicle.id in parent_intersection.stopped_vehicles:
@@ -276,21 +553,121 @@ class Simulation:
                      # Se è ancora qui ma ha velocità > 2, vuol dire che è ripartito -> Reset
                      if vehicle.v > 2:
                          parent_intersection.stopped_vehicles.remove(vehicle.id)
-                
-        # --- (Riporto la parte finale per completezza) ---
-        for segment in self.segments:
-            if len(segment.vehicles) == 0: continue
+
+    def update(self):
+        prof = self.profiler
+        if prof is None:
+            # 1. Eventi dovuti entro la fine del passo: cambi dei semafori, comparsa e
+            #    scadenza degli ostacoli (gli ostacoli scaduti escono da self.obstacles)
+            self.events.run_until(self.t + self.dt)
+            # 2. Aggiorna veicoli
+            self._step_vehicles()
+            # 3. Passaggio al segmento successivo
+            self._transfer_vehicles()
+            # 4. Tentativi dei generatori dovuti a questo passo
+            self.spawn_events.run_until(self.t)
+        else:
+            prof.time("events", self.events.run_until, self.t + self.dt)
+            prof.time("vehicles", self._step_vehicles)
+            prof.time("transfers", self._transfer_vehicles)
+            prof.time("generators", self.spawn_events.run_until, self.t)
+            prof.steps += 1
+        self.t += self.dt
+        self.frame_count += 1
+
+        if self.statistics is not None:
+            self.statistics.end_step(self)
+        if self.recorder is not None:
+            if prof is None:
+                self.recorder.record(self)
+            else:
+                prof.time("recorder", self.recorder.record, self)
+
+    def _step_vehicles(self):
+        if self.engine is not None:
+            self.engine.step(self, self.dt)
+        else:
+            self._update_vehicles()
+
+    def _transfer_vehicles(self):
+        """Passaggio al segmento successivo dei veicoli arrivati a fine strada (solo segmenti occupati)"""
+        for segment_index in sorted(self.active_segments):
+            segment = self.segments[segment_index]
+            if len(segment.vehicles) == 0:
+                # Svuotato dall'esterno (es. Segment.remove_vehicle)
+                self.active_segments.discard(segment_index)
+                continue
             vehicle_id = segment.vehicles[0]
             vehicle = self.vehicles[vehicle_id]
             if vehicle.x >= segment.get_length():
+                finished = False
                 if vehicle.current_road_index + 1 < len(vehicle.path):
                     vehicle.current_road_index += 1
                     next_road_index = vehicle.path[vehicle.current_road_index]
-                    self.segments[next_road_index].vehicles.append(vehicle_id)
+                    next_segment = self.segments[next_road_index]
+                    next_segment.vehicles.append(vehicle_id)
+                    self.active_segments.add(next_road_index)
+                    if next_segment.stats is not None:
+                        next_segment.stats.entries += 1
+                else:
+                    finished = True
+                if segment.stats is not None:
+                    segment.stats.exits += 1
                 vehicle.x = 0
-                segment.vehicles.popleft() 
+                segment.vehicles.popleft()
+                if len(segment.vehicles) == 0:
+                    self.active_segments.discard(segment_index)
+                # Il veicolo lascia la strada: non conta più come "fermo allo STOP"
+                parent_intersection = self.incoming_intersections.get(segment_index)
+                if parent_intersection:
+                    parent_intersection.stopped_vehicles.discard(vehicle_id)
+                if finished:
+                    self._retire_vehicle(vehicle)
 
-        for gen in self.vehicle_generator:
-            gen.update(self)
-        self.t += self.dt
-        self.frame_count += 1
+    def save_state(self):
+        """Stato dinamico (veicoli, semafori, ostacoli, generatori, eventi, RNG) come bytes, senza la rete"""
+        return state.save_state(self)
+
+    def load_state(self, blob):
+        """Riprende da uno stato di save_state; la simulazione deve avere la stessa rete (vedi core/state.py)"""
+        state.load_state(self, blob)
+
+    def fork(self):
+        """
+        Nuova simulazione che parte dallo stato attuale di questa: la rete (geometria, topologia,
+        percorsi, incroci) è condivisa come in copy_network, lo stato dinamico è copiato.
+        Le due simulazioni proseguono in modo indipendente (vedi anche branches.run_branches),
+        tranne che per il generatore casuale: i generatori di veicoli usano quello globale di
+        NumPy, quindi nello stesso processo le estrazioni di una diramazione spostano quelle
+        delle altre. Per diramazioni riproducibili bit per bit si salva np.random.get_state()
+        prima di fork e lo si ripristina con np.random.set_state prima di eseguire ciascuna.
+        """
+        branch = self.copy_network()
+        state.load_state(branch, state.save_state(self, _fingerprint=False), check_network=False)
+        return branch
+
+    def enable_statistics(self, window, sink):
+        """
+        Attiva le statistiche per segmento (vedi SegmentStatistics): ogni `window` secondi
+        di simulazione sink(righe) riceve flusso, densità, velocità e CO2 dei segmenti con traffico.
+        """
+        self.statistics = SegmentStatistics(window, sink)
+        self.statistics.attach(self)
+        return self.statistics
+
+    def disable_statistics(self):
+        if self.statistics is not None:
+            self.statistics.detach(self)
+        self.statistics = None
+
+    def enable_profiling(self):
+        """Attiva (o azzera) la profilazione di update e restituisce il Profiler"""
+        self.profiler = Profiler()
+        return self.profiler
+
+    def disable_profiling(self):
+        self.profiler = None
+
+    def profile_report(self):
+        """Report strutturato della profilazione (vedi Profiler.report), None se non attiva"""
+        return self.profiler.report(self) if self.profiler is not None else None
@@ -0,0 +1,138 @@
+"""Esecuzione della simulazione in un thread separato dal disegno.
+
+Il worker avanza la simulazione al proprio ritmo e, a intervalli regolari, pubblica
+uno `Snapshot` immutabile con quanto serve al visualizzatore (posizioni dei veicoli,
+stato dei semafori, ostacoli). Il disegno legge sempre l'ultimo snapshot completo:
+non tocca mai lo stato dinamico della simulazione mentre il worker lo modifica.
+"""
+from collections import namedtuple
+import threading
+import time
+
+# segments:  ((indice segmento, ((x, l, w, classe), ...)), ...) solo per i segmenti occupati,
+#            in ordine di indice; x è la distanza dall'inizio del segmento
+# lights:    (stato, ...) nello stesso ordine di sim.traffic_lights
+# obstacles: ((indice segmento, x, larghezza, colore), ...)
+Snapshot = namedtuple("Snapshot", "t frame_count segments lights obstacles")
+
+
+def take_snapshot(sim):
+    """Fotografia immutabile dello stato dinamico di `sim`.
+
+    Le posizioni restano in coordinate di segmento: la conversione in coordinate
+    mondo la fa il visualizzatore, solo per i segmenti visibili.
+    """
+    vehicles = sim.vehicles
+    segments = []
+    for segment_index in sorted(sim.active_segments):
+        segment_vehicles = []
+        for vehicle_id in sim.segments[segment_index].vehicles:
+            vehicle = vehicles[vehicle_id]
+            segment_vehicles.append((vehicle.x, vehicle.l, vehicle.w, vehicle.vehicle_class))
+        segments.append((segment_index, tuple(segment_vehicles)))
+
+    return Snapshot(sim.t, sim.frame_count, tuple(segments),
+                    tuple(tl.state for tl in sim.traffic_lights),
+                    tuple((obs.segment_id, obs.x, obs.width, obs.color) for obs in sim.obstacles))
+
+
+class SimulationWorker:
+    """Thread che esegue `sim.update()` e pubblica snapshot in doppio buffer.
+
+    - steps_per_second: ritmo massimo della simulazione (None = il più veloce possibile)
+    - publish_interval: budget di tempo reale (secondi) tra due snapshot; i passi
+      vengono eseguiti a blocchi finché il budget non è esaurito, quindi il ritmo
+      della simulazione non dipende dal tempo di disegno
+
+    Il worker parte in pausa: resume() avvia la simulazione, pause() la ferma.
+    """
+
+    def __init__(self, simulation, steps_per_second=None, publish_interval=1/60):
+        self.simulation = simulation
+        self.publish_interval = publish_interval
+        self.running = False
+        self.measured_rate = 0.0  # passi al secondo effettivi dell'ultimo blocco
+
+        # Doppio buffer: il worker scrive sempre in quello non esposto e poi scambia
+        self._buffers = [take_snapshot(simulation), None]
+        self._front = 0
+
+        # Serializza i passi del thread e quelli richiesti dall'interfaccia (step)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread = None
+        self.set_rate(steps_per_second)
+
+    @property
+    def snapshot(self):
+        """Ultimo snapshot completo"""
+        return self._buffers[self._front]
+
+    def _publish(self):
+        back = 1 - self._front
+        self._buffers[back] = take_snapshot(self.simulation)
+        self._front = back
+
+    def set_rate(self, steps_per_second):
+        self.steps_per_second = steps_per_second
+        self._rate_start = time.perf_counter()
+        self._rate_steps = 0
+
+    def start(self):
+        if self._thread is None:
+            self._closing = False
+            self._thread = threading.Thread(target=self._loop, name="SimulationWorker", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Ferma il thread e attende la fine del blocco di passi in corso"""
+        self._closing = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def resume(self):
+        self.set_rate(self.steps_per_second)
+        self.running = True
+        self._wake.set()
+
+    def pause(self):
+        self.running = False
+
+    def step(self, steps=1):
+        """Esegue `steps` passi subito (anche in pausa) e pubblica lo snapshot"""
+        with self._lock:
+            self.simulation.run(steps)
+            self._publish()
+
+    def _loop(self):
+        sim = self.simulation
+        clock = time.perf_counter
+        while not self._closing:
+            if not self.running:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            start = clock()
+            deadline = start + self.publish_interval
+            steps = 0
+            with self._lock:
+                while self.running and clock() < deadline:
+                    if self.steps_per_second is not None:
+                        allowed = (clock() - self._rate_start) * self.steps_per_second
+                        if self._rate_steps >= allowed:
+                            break
+                    sim.update()
+                    steps += 1
+                    self._rate_steps += 1
+                if steps:
+                    self._publish()
+
+            # Ritmo limitato: il resto del budget si passa senza tenere occupato l'interprete
+            remaining = deadline - clock()
+            if remaining > 0:
+                time.sleep(remaining)
+            self.measured_rate = steps / (clock() - start)
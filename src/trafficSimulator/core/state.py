@@ -0,0 +1,211 @@
+"""Salvataggio e ripristino dello stato dinamico di una simulazione.
+
+    blob = sim.save_state()             # bytes
+    ...
+    sim2 = ConfigLoader().build_network(config)   # stessa rete, nessun veicolo
+    sim2.load_state(blob)               # prosegue bit per bit come sim
+
+Lo stato contiene solo la parte dinamica: veicoli (valori numerici per colonne in
+array NumPy), code dei segmenti, semafori, ostacoli, generatori, calendari degli
+eventi, veicoli fermi agli STOP, contatori degli ID e stato del generatore casuale
+di NumPy. La geometria non viene salvata: al suo posto c'è un'impronta della rete,
+controllata al ripristino. Registratore, profiler e statistiche non fanno parte dello stato.
+
+Lo stato è un pickle: al caricamento sono ammesse solo le classi del modello, i tipi di
+base e le funzioni di ricostruzione degli array NumPy (vedi _StateUnpickler.find_class).
+"""
+import hashlib
+import io
+import pickle
+
+import numpy as np
+
+from .geometry.segment import Segment
+from .obstacle import Obstacle
+from .traffic_light import TrafficLight
+from .vehicle import Vehicle
+from .vehicle_generator import VehicleGenerator
+
+STATE_FORMAT = 1
+
+# Campi del veicolo salvati come colonne float64; gli altri come liste di valori Python
+_FLOAT_COLUMNS = ('x', 'v', 'a', 'co2_emissions', 'rpm')
+_VEHICLE_FIELDS = tuple(name for name in Vehicle.__slots__ if name not in ('_engine', '_slot'))
+
+# Nomi globali ammessi in uno stato: niente funzioni che aprono file o eseguono codice
+_MODEL_CLASSES = {(cls.__module__, cls.__name__): cls
+                  for cls in (Vehicle, VehicleGenerator, TrafficLight, Obstacle)}
+_BUILTINS = {"set", "frozenset", "list", "tuple", "dict", "int", "float", "complex", "bool",
+             "str", "bytes", "bytearray", "slice", "range"}
+_NUMPY_MODULES = {"numpy", "numpy.core.multiarray", "numpy._core.multiarray",
+                  "numpy.core.numeric", "numpy._core.numeric"}
+_NUMPY_NAMES = {"dtype", "ndarray", "scalar", "_reconstruct", "_frombuffer"}
+
+
+def network_fingerprint(sim):
+    """Impronta della rete (segmenti, connessioni e incroci) a cui lo stato si riferisce"""
+    digest = hashlib.sha1()
+    for seg in sim.segments:
+        first, last = seg.points[0], seg.points[-1]
+        digest.update(repr((seg.id_segment, seg.get_length(), tuple(first), tuple(last))).encode())
+    digest.update(repr(sorted((i, tuple(s)) for i, s in sim.topology.successors.items())).encode())
+    digest.update(repr([inter.id for inter in sim.intersections]).encode())
+    return digest.hexdigest()
+
+
+class _StatePickler(pickle.Pickler):
+    """Salva i riferimenti alla simulazione e ai segmenti come identificativi, non per valore
+    (es. i callback degli eventi sono metodi della simulazione)"""
+
+    def __init__(self, file, sim):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.sim = sim
+
+    def persistent_id(self, obj):
+        if obj is self.sim:
+            return ("simulation",)
+        if isinstance(obj, Segment):
+            return ("segment", self.sim.index_of(obj))
+        return None
+
+
+class _StateUnpickler(pickle.Unpickler):
+    def __init__(self, file, sim):
+        super().__init__(file)
+        self.sim = sim
+
+    def find_class(self, module, name):
+        if (module, name) in _MODEL_CLASSES:
+            return _MODEL_CLASSES[(module, name)]
+        if module == "builtins" and name in _BUILTINS:
+            return super().find_class(module, name)
+        if module == "builtins" and name == "getattr":
+            # I callback (eventi, on_toggle) sono metodi della simulazione
+            return self._simulation_method
+        if module in _NUMPY_MODULES and name in _NUMPY_NAMES:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"Global '{module}.{name}' is not allowed in a simulation state.")
+
+    def _simulation_method(self, obj, name):
+        if obj is not self.sim or name.startswith("__") or not callable(getattr(type(obj), name, None)):
+            raise pickle.UnpicklingError(f"Attribute {name!r} is not allowed in a simulation state.")
+        return getattr(obj, name)
+
+    def persistent_load(self, pid):
+        if pid[0] == "simulation":
+            return self.sim
+        if pid[0] == "segment":
+            return self.sim.segments[pid[1]]
+        raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}")
+
+
+def _vehicle_columns(vehicles):
+    columns = {}
+    for name in _VEHICLE_FIELDS:
+        values = [getattr(veh, name) for veh in vehicles]
+        columns[name] = np.array(values, dtype=np.float64) if name in _FLOAT_COLUMNS else values
+    return columns
+
+
+def _vehicles_from_columns(columns, count):
+    values = {name: column.tolist() if name in _FLOAT_COLUMNS else column
+              for name, column in columns.items()}
+    vehicles = []
+    for i in range(count):
+        veh = Vehicle.__new__(Vehicle)
+        veh._engine = None
+        veh._slot = None
+        for name in _VEHICLE_FIELDS:
+            setattr(veh, name, values[name][i])
+        vehicles.append(veh)
+    return vehicles
+
+
+def save_state(sim, _fingerprint=True):
+    """
+    Stato dinamico di `sim` come bytes (vedi load_state). _fingerprint=False (uso interno,
+    Simulation.fork) non calcola l'impronta della rete: lo stato si può allora caricare
+    solo con check_network=False.
+    """
+    vehicles = list(sim.vehicles.values())
+    state = {
+        "format": STATE_FORMAT,
+        "network": network_fingerprint(sim) if _fingerprint else None,
+        "clock": (sim.t, sim.frame_count, sim.dt),
+        "ids": (sim.next_vehicle_id, list(sim.free_vehicle_ids), sim.vehicles_spawned, sim.vehicles_finished),
+        "vehicle_count": len(vehicles),
+        "vehicles": _vehicle_columns(vehicles),
+        "queues": {index: list(sim.segments[index].vehicles) for index in sorted(sim.active_segments)},
+        "stopped": [sorted(inter.stopped_vehicles) for inter in sim.intersections],
+        # Oggetti salvati insieme: le identità condivise (es. semaforo in un evento e
+        # nell'indice delle barriere) restano tali dopo il ripristino
+        "objects": {
+            "traffic_lights": sim.traffic_lights,
+            "obstacles": sim.obstacles,
+            "generators": sim.vehicle_generator,
+            "barriers": (sim.barrier_index.positions, sim.barrier_index.barriers),
+            "events": sim.events.get_state(),
+            "spawn_events": sim.spawn_events.get_state(),
+        },
+        "random": np.random.get_state(),
+    }
+    buffer = io.BytesIO()
+    _StatePickler(buffer, sim).dump(state)
+    return buffer.getvalue()
+
+
+def load_state(sim, blob, check_network=True):
+    """
+    Sostituisce lo stato dinamico di `sim` con quello salvato in `blob`. `sim` deve avere
+    la stessa rete della simulazione salvata (es. costruita dalla stessa configurazione
+    o con copy_network); altrimenti ValueError. check_network=False salta il controllo
+    quando la rete è certamente la stessa (es. Simulation.fork). Un blob con oggetti
+    diversi da quelli del modello solleva pickle.UnpicklingError; resta comunque da
+    caricare solo stati di provenienza fidata.
+    """
+    state = _StateUnpickler(io.BytesIO(blob), sim).load()
+    if state.get("format") != STATE_FORMAT:
+        raise ValueError(f"Unsupported simulation state format {state.get('format')!r}.")
+    if check_network and state["network"] is None:
+        raise ValueError("Simulation state was saved without a network fingerprint.")
+    if check_network and state["network"] != network_fingerprint(sim):
+        raise ValueError("Simulation state was saved from a different road network.")
+
+    # Via lo stato attuale
+    for index in sim.active_segments:
+        sim.segments[index].vehicles.clear()
+    sim.active_segments = set()
+    sim.vehicles = {}
+    if sim.engine is not None:
+        sim.engine = type(sim.engine)()
+
+    sim.t, sim.frame_count, sim.dt = state["clock"]
+    next_id, free_ids, spawned, finished = state["ids"]
+    sim.next_vehicle_id = next_id
+    sim.free_vehicle_ids = free_ids
+    sim.vehicles_spawned = spawned
+    sim.vehicles_finished = finished
+
+    for veh in _vehicles_from_columns(state["vehicles"], state["vehicle_count"]):
+        sim.vehicles[veh.id] = veh
+        if sim.engine is not None:
+            sim.engine.attach(veh)
+    for index, queue in state["queues"].items():
+        sim.segments[index].vehicles.extend(queue)
+        sim.active_segments.add(index)
+
+    for inter, stopped in zip(sim.intersections, state["stopped"]):
+        inter.stopped_vehicles = set(stopped)
+        inter.approaches = {}
+        inter._approaches_frame = None
+
+    objects = state["objects"]
+    sim.traffic_lights = objects["traffic_lights"]
+    sim.obstacles = objects["obstacles"]
+    sim.vehicle_generator = objects["generators"]
+    sim.barrier_index.positions, sim.barrier_index.barriers = objects["barriers"]
+    sim.barrier_index._arrays = {}
+    sim.events.set_state(objects["events"])
+    sim.spawn_events.set_state(objects["spawn_events"])
+
+    np.random.set_state(state["random"])
@@ -0,0 +1,87 @@
+from math import floor, hypot
+
+
+class Topology:
+    """Grafo delle connessioni tra segmenti, costruito in modo incrementale.
+
+    Due segmenti sono connessi se la fine di uno coincide (entro `tolerance`
+    metri) con l'inizio dell'altro. Gli estremi sono inseriti in uno spatial
+    hash a celle di lato `tolerance`, quindi aggiungere un segmento costa O(1)
+    invece di confrontarlo con tutti gli altri.
+
+    `version` aumenta ad ogni modifica: chi tiene cache derivate dal grafo
+    (routing, visualizzatore) la confronta per sapere quando ricalcolarle.
+    """
+
+    def __init__(self, tolerance=0.5):
+        self.tolerance = tolerance
+        self.version = 0
+        self._reset()
+
+    def _reset(self):
+        self.successors = {}    # {indice: [indici dei segmenti che partono dalla sua fine]}
+        self.predecessors = {}  # {indice: [indici dei segmenti che finiscono al suo inizio]}
+        self.id_map = {}        # {id_segment: indice}
+
+        self._starts = {}  # {cella: [(indice, punto di inizio)]}
+        self._ends = {}    # {cella: [(indice, punto di fine)]}
+
+    def _cell(self, point):
+        return (floor(point[0] / self.tolerance), floor(point[1] / self.tolerance))
+
+    def _near(self, grid, point):
+        """Indici dei segmenti in `grid` con estremo a meno di `tolerance` da point"""
+        cx, cy = self._cell(point)
+        found = []
+        for i in (cx-1, cx, cx+1):
+            for j in (cy-1, cy, cy+1):
+                for index, other in grid.get((i, j), ()):
+                    if hypot(point[0]-other[0], point[1]-other[1]) < self.tolerance:
+                        found.append(index)
+        return sorted(found)
+
+    def add_segment(self, index, segment):
+        start = segment.points[0]
+        end = segment.points[-1]
+
+        self.successors[index] = [j for j in self._near(self._starts, end) if j != index]
+        self.predecessors[index] = [j for j in self._near(self._ends, start) if j != index]
+        for j in self.successors[index]:
+            self.predecessors[j].append(index)
+        for j in self.predecessors[index]:
+            self.successors[j].append(index)
+
+        self._starts.setdefault(self._cell(start), []).append((index, start))
+        self._ends.setdefault(self._cell(end), []).append((index, end))
+
+        if segment.id_segment:
+            self.id_map[segment.id_segment] = index
+        self.version += 1
+
+    def restore(self, segments, indptr, indices):
+        """
+        Ricostruisce il grafo da un'adiacenza già calcolata (formato CSR: i successori del
+        segmento i sono indices[indptr[i]:indptr[i+1]]), senza cercare le connessioni.
+        """
+        self._reset()
+        indptr = list(indptr)
+        indices = list(indices)
+        for index, segment in enumerate(segments):
+            self.successors[index] = indices[indptr[index]:indptr[index+1]]
+            self.predecessors[index] = []
+            start = segment.points[0]
+            end = segment.points[-1]
+            self._starts.setdefault(self._cell(start), []).append((index, start))
+            self._ends.setdefault(self._cell(end), []).append((index, end))
+            if segment.id_segment:
+                self.id_map[segment.id_segment] = index
+        for index in range(len(segments)):
+            for j in self.successors[index]:
+                self.predecessors[j].append(index)
+        self.version += 1
+
+    def rebuild(self, segments):
+        """Ricostruisce il grafo da zero (es. dopo aver modificato i punti di un segmento)"""
+        self._reset()
+        for index, segment in enumerate(segments):
+            self.add_segment(index, segment)
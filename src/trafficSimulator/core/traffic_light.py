@@ -5,7 +5,14 @@ class TrafficLight:
         self.cycle_time = cycle_time # Tempo in secondi per cambiare stato
         self.state = initial_state   # "red" o "green"
         
+        # Proprietà per renderlo compatibile con la logica dei veicoli (IDM) quando è rosso
+        self.v = 0
+        self.l = 0
+
         self.time_elapsed = 0
+        self.next_switch = None  # tempo del prossimo cambio di stato (gestito dalla simulazione)
+        self.event = None        # evento del prossimo cambio in sim.events (gestito dalla simulazione)
+        self.on_toggle = None   # callback(semaforo) chiamata ad ogni cambio di stato
 
     def update(self, dt):
         self.time_elapsed += dt
@@ -18,6 +25,8 @@ class TrafficLight:
             self.state = "green"
         else:
             self.state = "red"
+        if self.on_toggle:
+            self.on_toggle(self)
 
     @property
     def is_active(self):
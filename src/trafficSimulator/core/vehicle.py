@@ -1,20 +1,47 @@
-import uuid
 import numpy as np
 
 class Vehicle:
+    # Attributi fissi: niente __dict__ per veicolo (le reti grandi ne hanno migliaia)
+    __slots__ = (
+        'id', 'l', 'w', 's0', 'T', 'v_max', 'a_max', 'b_max', 'sqrt_ab', '_v_max',
+        'vehicle_class', 'engine_type', 'co2_emissions', 'rpm', 'fog_lights', 'rain_sensor',
+        'path', 'current_road_index', 'x', 'v', 'a', 'stopped',
+        'spawn_time',      # tempo di ingresso nella simulazione
+        'extra',           # chiavi di configurazione non previste (es. start_road, end_road)
+        '_engine', '_slot', # usati quando il veicolo è gestito da un VehicleEngine
+    )
+    # Attributi copiati da clone: tutti tranne quelli legati alla singola istanza
+    _CLONED_SLOTS = tuple(name for name in __slots__ if name not in ('id', 'spawn_time', '_engine', '_slot'))
+
     def __init__(self, config={}):
         # Set default configuration
         self.set_default_config()
 
         # Update configuration
         for attr, val in config.items():
-            setattr(self, attr, val)
+            try:
+                setattr(self, attr, val)
+            except AttributeError:
+                self.extra[attr] = val
 
         # Calculate properties
         self.init_properties()
         
+    def __getattr__(self, name):
+        # Chiamato solo se l'attributo non esiste: cerchiamo tra le chiavi extra
+        if name == 'extra':
+            raise AttributeError(name)
+        try:
+            return self.extra[name]
+        except KeyError:
+            raise AttributeError(f"'Vehicle' object has no attribute '{name}'") from None
+
     def set_default_config(self):    
-        self.id = uuid.uuid4()
+        self.id = None  # intero assegnato dalla simulazione in add_vehicle
+        self.extra = {}
+        self.spawn_time = None
+        self._engine = None
+        self._slot = None
 
         # Proprietà Fisiche base
         self.l = 4          # Lunghezza
@@ -42,6 +69,16 @@ class Vehicle:
         self.v = 0
         self.a = 0
         self.stopped = False
+
+    def clone(self):
+        """Nuovo veicolo con gli stessi valori (senza ID): i generatori lo usano per istanziare i loro modelli"""
+        veh = Vehicle.__new__(Vehicle)
+        for name in Vehicle._CLONED_SLOTS:
+            setattr(veh, name, getattr(self, name))
+        veh.id, veh.spawn_time, veh._engine, veh._slot = None, None, None, None
+        veh.extra = dict(self.extra)
+        return veh
+
     def init_properties(self):
         self.sqrt_ab = 2*np.sqrt(self.a_max*self.b_max)
         self._v_max = self.v_max
@@ -0,0 +1,281 @@
+from time import perf_counter_ns
+
+import numpy as np
+from .vehicle import Vehicle
+
+# Campi numerici del veicolo che vivono negli array del motore
+FLOAT_FIELDS = ('x', 'v', 'a', 'l', 's0', 'T', 'v_max', 'a_max', 'b_max', 'sqrt_ab', 'rpm', 'co2_emissions')
+
+
+class VehicleView(Vehicle):
+    """Veicolo i cui campi numerici sono una "vista" sugli array di un VehicleEngine.
+
+    Si comporta come un normale Vehicle (Window e script utente continuano a
+    leggere vehicle.x, vehicle.v, ...), ma i valori sono letti e scritti
+    direttamente negli array contigui del motore.
+    """
+    __slots__ = ()  # stessa struttura di Vehicle: permette di cambiare __class__
+
+    def update(self, lead, dt):
+        raise RuntimeError("I veicoli gestiti da un VehicleEngine vengono aggiornati dal motore")
+
+
+def _float_view(name):
+    def fget(self):
+        return float(getattr(self._engine, name)[self._slot])
+
+    def fset(self, value):
+        getattr(self._engine, name)[self._slot] = value
+
+    return property(fget, fset)
+
+
+def _stopped_get(self):
+    return bool(self._engine.stopped[self._slot])
+
+
+def _stopped_set(self, value):
+    self._engine.stopped[self._slot] = value
+
+
+# Slot originale di Vehicle, nascosto dalla property di VehicleView
+_engine_type_slot = Vehicle.engine_type
+
+
+def _engine_type_get(self):
+    return _engine_type_slot.__get__(self)
+
+
+def _engine_type_set(self, value):
+    _engine_type_slot.__set__(self, value)
+    self._engine.electric[self._slot] = value == "electric"
+
+
+for _name in FLOAT_FIELDS:
+    setattr(VehicleView, _name, _float_view(_name))
+VehicleView.stopped = property(_stopped_get, _stopped_set)
+VehicleView.engine_type = property(_engine_type_get, _engine_type_set)
+
+
+class VehicleEngine:
+    """Motore vettoriale (structure-of-arrays) per l'aggiornamento dei veicoli.
+
+    Posizione, velocità, accelerazione e parametri IDM di tutti i veicoli sono
+    tenuti in array NumPy contigui: l'aggiornamento balistico e l'accelerazione
+    IDM vengono calcolati con poche operazioni vettoriali per passo.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = 0
+        self.size = 0
+        self.slot_of = {}  # {vehicle_id: slot}
+        self.free_slots = []  # slot liberati da detach, riusati da attach
+        for name in FLOAT_FIELDS:
+            setattr(self, name, np.zeros(0))
+        self.stopped = np.zeros(0, dtype=bool)
+        self.electric = np.zeros(0, dtype=bool)
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        for name in FLOAT_FIELDS + ('stopped', 'electric'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def attach(self, vehicle):
+        """Sposta i campi del veicolo negli array e lo trasforma in una VehicleView"""
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.size == self.capacity:
+                self._grow(2*self.capacity)
+            slot = self.size
+            self.size += 1
+
+        for name in FLOAT_FIELDS:
+            getattr(self, name)[slot] = getattr(vehicle, name)
+        self.stopped[slot] = vehicle.stopped
+        self.electric[slot] = vehicle.engine_type == "electric"
+
+        vehicle._engine = self
+        vehicle._slot = slot
+        vehicle.__class__ = VehicleView
+        self.slot_of[vehicle.id] = slot
+
+    def detach(self, vehicle):
+        """Riporta i valori degli array nel veicolo (di nuovo un Vehicle) e libera lo slot"""
+        slot = self.slot_of.pop(vehicle.id)
+        values = {name: float(getattr(self, name)[slot]) for name in FLOAT_FIELDS}
+        stopped = bool(self.stopped[slot])
+
+        vehicle.__class__ = Vehicle
+        for name, value in values.items():
+            setattr(vehicle, name, value)
+        vehicle.stopped = stopped
+        vehicle._engine = None
+        vehicle._slot = None
+        self.free_slots.append(slot)
+
+    def step(self, sim, dt):
+        """Aggiorna tutti i veicoli presenti sui segmenti della simulazione"""
+        slot_of = self.slot_of
+
+        # 1. Raccogliamo i veicoli segmento per segmento (ordine: dal primo all'ultimo)
+        chunks = []
+        for segment_index in sorted(sim.active_segments):
+            segment = sim.segments[segment_index]
+            slots = np.fromiter(map(slot_of.__getitem__, segment.vehicles), dtype=np.intp, count=len(segment.vehicles))
+            chunks.append((segment_index, segment, slots))
+        if not chunks:
+            return
+
+        order = np.concatenate([slots for _, _, slots in chunks])
+        n = len(order)
+        prof = sim.profiler
+        if prof is not None:
+            stamp = perf_counter_ns()
+
+        # 2. Aggiornamento balistico di posizione e velocità (dati del passo precedente)
+        x_before, v_before, a_before = self.x[order], self.v[order], self.a[order]
+        l = self.l[order]
+        # Le barriere rilevanti sono quelle davanti al muso PRIMA del movimento
+        front = x_before + l
+        v_new = v_before + a_before*dt
+        backwards = v_new < 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.where(backwards, x_before - 1/2*v_before*v_before/a_before,
+                         x_before + (v_new*dt + a_before*dt*dt/2))
+        v = np.where(backwards, 0.0, v_new)
+        if prof is not None:
+            # Movimento e accelerazione IDM (punto 5) contano come un'unica fase
+            now = perf_counter_ns()
+            idm_ns, stamp = now - stamp, now
+
+        # 3. Barriere virtuali degli incroci. Il motore scalare controlla ogni veicolo subito
+        # prima di muoverlo: quando un incrocio guarda le strade entranti (approach_summary),
+        # i veicoli che lo precedono nell'ordine di aggiornamento si sono già spostati e gli
+        # altri no. Scriviamo quindi le nuove posizioni negli array fino al veicolo controllato
+        # (written), così i risultati coincidono con quelli del motore scalare.
+        ib_x = np.full(n, np.inf)
+        ib_l = np.zeros(n)
+        offset = 0
+        written = 0
+        for segment_index, segment, slots in chunks:
+            parent_intersection = sim.incoming_intersections.get(segment_index)
+            if parent_intersection:
+                length = segment.get_length()
+                for j, slot in enumerate(slots):
+                    if length - self.x[slot] >= 15: break
+                    if written < offset + j:
+                        self.x[order[written:offset+j]] = x[written:offset+j]
+                        self.v[order[written:offset+j]] = v[written:offset+j]
+                        written = offset + j
+                    vehicle = sim.vehicles[segment.vehicles[j]]
+                    if prof is not None:
+                        start = perf_counter_ns()
+                        is_clear = parent_intersection.check_clearance(vehicle, segment_index)
+                        prof.add(prof.intersections, parent_intersection.id, perf_counter_ns() - start)
+                    else:
+                        is_clear = parent_intersection.check_clearance(vehicle, segment_index)
+                    if not is_clear:
+                        l_barrier = self.l[slot] if segment_index in parent_intersection.stop_signs else 0
+                        ib_x[offset+j:offset+len(slots)] = length
+                        ib_l[offset+j:offset+len(slots)] = l_barrier
+            offset += len(slots)
+        self.x[order] = x
+        self.v[order] = v
+        if prof is not None:
+            stamp = self._profile(prof, "vehicles.intersections", stamp)
+
+        # 4. Leader di ogni veicolo: veicolo davanti o barriera più vicina
+        lead_x = np.full(n, np.inf)
+        lead_l = np.zeros(n)
+        lead_v = np.zeros(n)
+        bar_x = np.full(n, np.inf)
+        bar_l = np.zeros(n)
+        offset = 0
+        for segment_index, segment, slots in chunks:
+            k = len(slots)
+            sl = slice(offset, offset+k)
+            if k > 1:
+                lead_x[offset+1:offset+k] = x[offset:offset+k-1]
+                lead_l[offset+1:offset+k] = l[offset:offset+k-1]
+                lead_v[offset+1:offset+k] = v[offset:offset+k-1]
+
+            barriers = sim.barrier_index.arrays(segment_index)
+            if barriers is not None:
+                positions, lengths = barriers
+                idx = np.searchsorted(positions, front[sl], side='right')
+                found = idx < len(positions)
+                idx = np.minimum(idx, len(positions)-1)
+                bar_x[sl] = np.where(found, positions[idx], np.inf)
+                bar_l[sl] = np.where(found, lengths[idx], 0)
+            offset += k
+
+        use_ib = (ib_x > front) & (ib_x < bar_x)
+        bar_x = np.where(use_ib, ib_x, bar_x)
+        bar_l = np.where(use_ib, ib_l, bar_l)
+
+        use_bar = bar_x < lead_x
+        lead_x = np.where(use_bar, bar_x, lead_x)
+        lead_l = np.where(use_bar, bar_l, lead_l)
+        lead_v = np.where(use_bar, 0.0, lead_v)
+        has_lead = np.isfinite(lead_x)
+        if prof is not None:
+            stamp = self._profile(prof, "vehicles.barriers", stamp)
+
+        # 5. Accelerazione IDM
+        s0, T, sqrt_ab = self.s0[order], self.T[order], self.sqrt_ab[order]
+        v_max, a_max, b_max = self.v_max[order], self.a_max[order], self.b_max[order]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_x = lead_x - x - lead_l
+            delta_v = v - lead_v
+            alpha = (s0 + np.maximum(0, T*v + delta_v*v/sqrt_ab)) / delta_x
+        alpha = np.where(has_lead, alpha, 0.0)
+        # float_power: stesso arrotondamento delle potenze sui singoli float del motore scalare
+        a = a_max * (1-np.float_power(v/v_max, 4) - np.float_power(alpha, 2))
+        a = np.where(self.stopped[order], -b_max*v/v_max, a)
+        self.a[order] = a
+
+        # 6. Dati OBU (RPM e CO2)
+        self.rpm[order] = np.where(v > 0.1, 800 + v*150, 800)
+        self.co2_emissions[order] = np.where(self.electric[order], 0.0, 2.0 + np.maximum(0, a)*10 + v*0.5)
+        if prof is not None:
+            prof.add(prof.phases, "vehicles.idm", idm_ns + perf_counter_ns() - stamp)
+
+        # Statistiche per segmento: campioni del passo riassunti per segmento e uniti agli accumulatori
+        if sim.statistics is not None:
+            self._accumulate_stats(chunks, v, x - x_before, self.co2_emissions[order], dt)
+
+        # 7. Pulizia dei veicoli ripartiti dopo uno STOP
+        for segment_index, segment, slots in chunks:
+            parent_intersection = sim.incoming_intersections.get(segment_index)
+            if parent_intersection and parent_intersection.stopped_vehicles:
+                for vehicle_id, slot in zip(segment.vehicles, slots):
+                    if vehicle_id in parent_intersection.stopped_vehicles and self.v[slot] > 2:
+                        parent_intersection.stopped_vehicles.remove(vehicle_id)
+
+    @staticmethod
+    def _profile(prof, phase, stamp):
+        """Somma a `phase` il tempo trascorso da `stamp` e restituisce il nuovo riferimento"""
+        now = perf_counter_ns()
+        prof.add(prof.phases, phase, now - stamp)
+        return now
+
+    @staticmethod
+    def _accumulate_stats(chunks, v, distance, co2, dt):
+        counts = np.array([len(slots) for _, _, slots in chunks])
+        occupied = counts > 0
+        counts = counts[occupied]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        means = np.add.reduceat(v, starts) / counts
+        m2 = np.add.reduceat((v - np.repeat(means, counts))**2, starts)
+        metres = np.add.reduceat(distance, starts)
+        co2_grams = np.add.reduceat(co2 * distance, starts) / 1000
+        segments = [segment for (_, segment, _), keep in zip(chunks, occupied) if keep]
+        for segment, k, mean, sq, d, g in zip(segments, counts.tolist(), means.tolist(), m2.tolist(),
+                                             metres.tolist(), co2_grams.tolist()):
+            if segment.stats is not None:
+                segment.stats.merge(k, k * dt, d, g, mean, sq)
@@ -1,5 +1,7 @@
 from .vehicle import Vehicle
 from numpy.random import randint
+from bisect import bisect_left
+from itertools import accumulate
 
 class VehicleGenerator:
     def __init__(self, config={}):
@@ -20,30 +22,43 @@ class VehicleGenerator:
             (1, {})
         ]
         self.last_added_time = 0
+        self.next_attempt = None  # tempo del prossimo tentativo (gestito dalla simulazione)
+        self.event = None         # evento del prossimo tentativo in sim.spawn_events (gestito dalla simulazione)
 
     def init_properties(self):
+        # Un veicolo modello per configurazione e pesi cumulativi per l'estrazione
+        # (richiamare init_properties dopo aver modificato self.vehicles)
+        self.templates = [Vehicle(config) for (weight, config) in self.vehicles]
+        self.cumulative_weights = list(accumulate(weight for (weight, config) in self.vehicles))
         self.upcoming_vehicle = self.generate_vehicle()
 
     def generate_vehicle(self):
-        """Returns a random vehicle from self.vehicles with random proportions"""
-        total = sum(pair[0] for pair in self.vehicles)
-        r = randint(1, total+1)
-        for (weight, config) in self.vehicles:
-            r -= weight
-            if r <= 0:
-                return Vehicle(config)
+        """Returns a random vehicle template from self.vehicles with random proportions"""
+        r = randint(1, self.cumulative_weights[-1]+1)
+        return self.templates[bisect_left(self.cumulative_weights, r)]
+
+    @property
+    def period(self):
+        """Secondi tra due veicoli generati"""
+        return 60 / self.vehicle_rate
 
     def update(self, simulation):
         """Add vehicles"""
-        if simulation.t - self.last_added_time >= 60 / self.vehicle_rate:
-            print('adding vehicle')
-            # If time elasped after last added vehicle is
-            # greater than vehicle_period; generate a vehicle
-            segment = simulation.segments[self.upcoming_vehicle.path[0]]      
-            if len(segment.vehicles) == 0\
-               or simulation.vehicles[segment.vehicles[-1]].x > self.upcoming_vehicle.s0 + self.upcoming_vehicle.l:
-                # If there is space for the generated vehicle; add it
-                simulation.add_vehicle(self.upcoming_vehicle)
-                # Reset last_added_time and upcoming_vehicle
-                self.last_added_time = simulation.t
-            self.upcoming_vehicle = self.generate_vehicle()
+        if simulation.t - self.last_added_time >= self.period:
+            self.try_spawn(simulation)
+
+    def try_spawn(self, simulation):
+        """Prova ad aggiungere il prossimo veicolo; restituisce True se è stato aggiunto"""
+        added = False
+        template = self.upcoming_vehicle
+        segment = simulation.segments[template.path[0]]
+        if len(segment.vehicles) == 0\
+           or simulation.vehicles[segment.vehicles[-1]].x > template.s0 + template.l:
+            # If there is space for the generated vehicle; add it
+            # (il veicolo vero e proprio viene creato solo ora, copiando il modello)
+            simulation.add_vehicle(template.clone())
+            # Reset last_added_time and upcoming_vehicle
+            self.last_added_time = simulation.t
+            added = True
+        self.upcoming_vehicle = self.generate_vehicle()
+        return added
@@ -0,0 +1,59 @@
+"""Esecuzione headless di una configurazione: nessun import del visualizzatore."""
+import json
+import time
+
+import numpy as np
+
+from .core.config_loader import ConfigLoader
+
+
+def summarize(sim, wall_time):
+    """Metriche riassuntive di una simulazione eseguita in wall_time secondi"""
+    on_road = [sim.vehicles[vehicle_id] for segment in sim.segments for vehicle_id in segment.vehicles]
+    return {
+        "steps": sim.frame_count,
+        "dt": sim.dt,
+        "simulated_seconds": sim.t,
+        "wall_time_s": wall_time,
+        "sim_seconds_per_second": sim.t / wall_time if wall_time > 0 else float("inf"),
+        "steps_per_second": sim.frame_count / wall_time if wall_time > 0 else float("inf"),
+        "segments": len(sim.segments),
+        "vehicles_spawned": sim.vehicles_spawned,
+        "vehicles_finished": sim.vehicles_finished,
+        "vehicles_on_road": len(on_road),
+        "mean_speed": float(np.mean([veh.v for veh in on_road])) if on_road else 0.0,
+    }
+
+
+def run(config_path, steps, dt=None, engine="scalar", seed=None, output=None, cache_dir=None, profile=False):
+    """
+    Carica config_path, esegue `steps` passi e restituisce (opzionalmente salva) le metriche.
+    cache_dir: cartella delle reti compilate (la rete viene ricaricata invece che ricostruita)
+    profile: aggiunge alle metriche i tempi per fase di update (chiave "profile", vedi Profiler)
+    """
+    if seed is not None:
+        np.random.seed(seed)
+
+    start = time.perf_counter()
+    sim, _ = ConfigLoader(engine=engine, cache_dir=cache_dir).load_from_file(config_path)
+    load_time = time.perf_counter() - start
+    if dt is not None:
+        sim.dt = dt
+    if profile:
+        sim.enable_profiling()
+
+    start = time.perf_counter()
+    sim.run(steps)
+    wall_time = time.perf_counter() - start
+
+    metrics = summarize(sim, wall_time)
+    metrics["config"] = str(config_path)
+    metrics["engine"] = engine
+    metrics["seed"] = seed
+    metrics["load_time_s"] = load_time
+    if profile:
+        metrics["profile"] = sim.profile_report()
+    if output:
+        with open(output, 'w') as f:
+            json.dump(metrics, f, indent=2)
+    return metrics
@@ -0,0 +1,129 @@
+"""Sweep di scenari: stessa rete, parametri diversi, esecuzione parallela su più processi.
+
+    from trafficSimulator.sweep import run_sweep
+    rows = run_sweep(config, {"vehicle_generators.0.vehicle_rate": [5, 10, 20],
+                              "traffic_lights.*.cycle_time": [10, 20]},
+                     steps=3600, dt=0.1, seeds=[0, 1, 2])
+
+Ogni processo costruisce la rete (segmenti, topologia, percorsi) una sola volta e la
+riusa per tutte le esecuzioni che gli vengono assegnate (vedi Simulation.copy_network).
+"""
+from concurrent.futures import ProcessPoolExecutor
+import copy
+import csv
+import hashlib
+import itertools
+import json
+import time
+
+import numpy as np
+
+from .core.config_loader import ConfigLoader
+from .runner import summarize
+
+# Sezioni della configurazione che definiscono la rete (il resto è "domanda")
+NETWORK_KEYS = ("segments", "environment")
+
+# Reti già costruite in questo processo: {(hash rete, motore): simulazione modello}
+_TEMPLATES = {}
+
+
+def expand_grid(grid):
+    """{"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}]"""
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def _children(node, key):
+    if key == "*":
+        return list(node) if isinstance(node, list) else list(node.values())
+    if isinstance(node, list):
+        return [node[int(key)]]
+    return [node[key]]
+
+
+def set_param(config, path, value):
+    """
+    Assegna value al campo indicato da un percorso puntato, es. "vehicle_generators.0.vehicle_rate".
+    "*" applica il valore a tutti gli elementi di una lista, es. "traffic_lights.*.cycle_time".
+    """
+    keys = path.split(".")
+    nodes = [config]
+    for key in keys[:-1]:
+        nodes = [child for node in nodes for child in _children(node, key)]
+
+    last = keys[-1]
+    for node in nodes:
+        if isinstance(node, list):
+            indices = range(len(node)) if last == "*" else [int(last)]
+            for i in indices:
+                node[i] = value
+        else:
+            node[last] = value
+
+
+def network_key(config):
+    """Hash delle sole sezioni di rete della configurazione"""
+    network = json.dumps({key: config.get(key) for key in NETWORK_KEYS}, sort_keys=True)
+    return hashlib.sha1(network.encode()).hexdigest()
+
+
+def _network(config, engine):
+    key = (network_key(config), engine)
+    if key not in _TEMPLATES:
+        _TEMPLATES[key] = ConfigLoader(engine=engine).build_network(config)
+    return _TEMPLATES[key]
+
+
+def run_scenario(base_config, params, steps, dt=None, engine="scalar", seed=None):
+    """Esegue una combinazione di parametri e restituisce una riga di risultati (dict)"""
+    config = copy.deepcopy(base_config)
+    for path, value in params.items():
+        set_param(config, path, value)
+
+    if seed is not None:
+        np.random.seed(seed)
+
+    sim = _network(config, engine).copy_network()
+    ConfigLoader(engine=engine).populate(sim, config)
+    if dt is not None:
+        sim.dt = dt
+
+    start = time.perf_counter()
+    sim.run(steps)
+    wall_time = time.perf_counter() - start
+
+    row = dict(params)
+    row["seed"] = seed
+    row.update(summarize(sim, wall_time))
+    return row
+
+
+def _run_task(task):
+    return run_scenario(*task)
+
+
+def run_sweep(base_config, grid, steps, dt=None, engine="scalar", seeds=(0,), max_workers=None):
+    """
+    Esegue tutte le combinazioni di `grid` per ogni seed e restituisce una riga per esecuzione.
+    max_workers=1 esegue tutto nel processo corrente (utile per il debug).
+    """
+    tasks = [(base_config, params, steps, dt, engine, seed)
+             for params in expand_grid(grid) for seed in seeds]
+    if max_workers == 1:
+        return [_run_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_run_task, tasks))
+
+
+def write_table(rows, path):
+    """Salva i risultati in CSV (estensione .csv) oppure in JSON"""
+    if str(path).endswith(".csv"):
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as f:
+            json.dump(rows, f, indent=2)
@@ -0,0 +1,59 @@
+from math import floor
+
+
+class SegmentGrid:
+    """Indice spaziale a griglia delle bounding box dei segmenti.
+
+    Ogni segmento appartiene alla cella che contiene l'angolo minimo della sua
+    bounding box; per ogni cella si tiene l'unione delle bounding box dei suoi
+    segmenti, così una finestra rettangolare trova le celle (e i segmenti)
+    visibili senza controllare tutta la rete.
+    """
+
+    def __init__(self, segments, cell_size=200):
+        self.cell_size = cell_size
+        self.boxes = []   # [(xmin, ymin, xmax, ymax)] per indice di segmento
+        self.cells = {}   # {cella: [indici dei segmenti]}
+        self.bounds = {}  # {cella: (xmin, ymin, xmax, ymax) dei suoi segmenti}
+        # Quante celle oltre la propria si estende al massimo un segmento (in x e in y):
+        # una cella a sinistra o sotto la finestra può avere segmenti che vi entrano
+        self.reach = (0, 0)
+
+        for index, segment in enumerate(segments):
+            xs = [p[0] for p in segment.points]
+            ys = [p[1] for p in segment.points]
+            box = (min(xs), min(ys), max(xs), max(ys))
+            self.boxes.append(box)
+
+            cell = (floor(box[0] / cell_size), floor(box[1] / cell_size))
+            self.reach = (max(self.reach[0], floor(box[2] / cell_size) - cell[0]),
+                          max(self.reach[1], floor(box[3] / cell_size) - cell[1]))
+            self.cells.setdefault(cell, []).append(index)
+            if cell in self.bounds:
+                b = self.bounds[cell]
+                self.bounds[cell] = (min(b[0], box[0]), min(b[1], box[1]), max(b[2], box[2]), max(b[3], box[3]))
+            else:
+                self.bounds[cell] = box
+
+    @staticmethod
+    def _overlaps(box, rect):
+        return box[0] <= rect[2] and box[2] >= rect[0] and box[1] <= rect[3] and box[3] >= rect[1]
+
+    def visible_cells(self, rect):
+        """Celle con almeno un segmento che può intersecare rect = (xmin, ymin, xmax, ymax)"""
+        # Celle candidate: quelle coperte da rect, allargate verso il basso di self.reach
+        size = self.cell_size
+        x0, y0 = floor(rect[0] / size) - self.reach[0], floor(rect[1] / size) - self.reach[1]
+        x1, y1 = floor(rect[2] / size), floor(rect[3] / size)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.bounds):
+            # Finestra più grande della rete: conviene scorrere le celle occupate
+            candidates = self.bounds
+        else:
+            candidates = [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)
+                          if (cx, cy) in self.bounds]
+        return {cell for cell in candidates if self._overlaps(self.bounds[cell], rect)}
+
+    def query(self, rect):
+        """Indici dei segmenti la cui bounding box interseca rect"""
+        return [index for cell in self.visible_cells(rect) for index in self.cells[cell]
+                if self._overlaps(self.boxes[index], rect)]
@@ -1,9 +1,36 @@
 import dearpygui.dearpygui as dpg
-import numpy as np
+from ..core.profiler import format_report
+from ..core.simulation_worker import SimulationWorker, take_snapshot
+from .spatial_index import SegmentGrid
+
+# Variazione relativa di zoom oltre la quale il livello statico viene ridisegnato
+# (gli spessori delle linee sono in pixel e dipendono dallo zoom)
+STATIC_ZOOM_TOLERANCE = 0.05
+# Sotto questo zoom (pixel per metro) un veicolo è di pochi pixel: invece dei singoli
+# veicoli si colorano i segmenti in base alla densità, e le frecce non vengono disegnate
+LOD_ZOOM = 1.5
+# Spazio occupato da un veicolo in coda (metri): densità 1 = strada piena
+JAM_SPACING = 7.5
+# Frame disegnati tra due aggiornamenti del pannello di profilazione
+PROFILE_REFRESH_FRAMES = 30
+# Modalità threaded: passi al secondo per unità dello slider Speed (1 = circa un passo per frame a 60 fps)
+STEPS_PER_SPEED_UNIT = 60
 
 class Window:
-    def __init__(self, simulation):
+    def __init__(self, simulation, threaded=False, replay=None):
         self.simulation = simulation
+        # threaded=True: la simulazione avanza in un thread separato (SimulationWorker)
+        # e la finestra disegna l'ultimo snapshot pubblicato
+        self.worker = None
+        if threaded:
+            if replay is not None:
+                raise ValueError("A Window cannot be both threaded and in replay mode.")
+            self.worker = SimulationWorker(simulation, steps_per_second=STEPS_PER_SPEED_UNIT)
+        # replay=Recording: si riproduce la registrazione (stessa rete di `simulation`)
+        # senza simulare; Run la avanza di `speed` frame per frame disegnato
+        self.replay = replay
+        self.replay_index = 0
+        self._panel_frames = 0
 
         # --- AGGIUNGI QUESTO BLOCCO ---
         self.ROAD_COLORS = {
@@ -31,6 +58,25 @@ class Window:
         self.old_offset = (0, 0)
         self.zoom_speed = 1
 
+        # Disegno "retained": il contenuto statico viene ricreato solo quando cambia,
+        # gli elementi dinamici sono nodi riusati da un frame all'altro
+        self._overlay_key = None   # vista (zoom, offset, dimensioni) dell'ultimo sfondo disegnato
+        self._static_key = None    # stato della rete dell'ultimo livello statico disegnato
+        self._static_zoom = None
+        self.vehicle_pool = []     # [(nodo, linea)]
+        self.obstacle_pool = []    # [(nodo, rettangolo)]
+        self.light_pool = []       # [(nodo, luce)]
+        self._shown = {"vehicles": 0, "obstacles": 0}
+
+        # Culling: indice spaziale dei segmenti e parte di rete visibile
+        self.grid = None
+        self._cell_nodes = {}      # {cella della griglia: nodo con i suoi segmenti}
+        self._visible_cells = set()
+        self.visible_segments = set()
+        self._view_key = None
+        self.density_items = {}    # {indice segmento: polilinea colorata per densità}
+        self._density_shown = set()
+
         self.setup()
         self.setup_themes()
         self.create_windows()
@@ -84,6 +130,9 @@ class Window:
         
         dpg.add_draw_node(tag="OverlayCanvas", parent="MainWindow")
         dpg.add_draw_node(tag="Canvas", parent="MainWindow")
+        # Livelli del Canvas, dal basso verso l'alto
+        for layer in ("StaticLayer", "DensityLayer", "ObstacleLayer", "LightLayer", "VehicleLayer"):
+            dpg.add_draw_node(tag=layer, parent="Canvas")
 
         with dpg.window(
             tag="ControlsWindow",
@@ -97,9 +146,14 @@ class Window:
 
                 with dpg.group(horizontal=True):
                     dpg.add_button(label="Run", tag="RunStopButton", callback=self.toggle)
-                    dpg.add_button(label="Next frame", callback=self.simulation.update)
+                    dpg.add_button(label="Next frame", callback=self.next_frame)
 
                 dpg.add_slider_int(tag="SpeedInput", label="Speed", min_value=1, max_value=100,default_value=1, callback=self.set_speed)
+
+            if self.replay is not None:
+                with dpg.collapsing_header(label="Replay", default_open=True):
+                    dpg.add_slider_int(tag="ReplaySlider", label="Frame", min_value=0,
+                                       max_value=max(len(self.replay) - 1, 0), default_value=0, callback=self.seek)
             
             with dpg.collapsing_header(label="Simulation Status", default_open=True):
 
@@ -118,6 +172,13 @@ class Window:
                     with dpg.table_row():
                         dpg.add_text("Frame:")
                         dpg.add_text("_", tag="FrameStatus")
+
+                    with dpg.table_row():
+                        dpg.add_text("Steps/s:")
+                        dpg.add_text("_", tag="RateStatus")
+
+                dpg.add_checkbox(tag="ProfileCheckbox", label="Profile update phases", callback=self.toggle_profiling)
+                dpg.add_text("", tag="ProfileText")
             
             
             with dpg.collapsing_header(label="Camera Control", default_open=True):
@@ -147,7 +208,7 @@ class Window:
             dpg.add_mouse_wheel_handler(callback=self.mouse_wheel)
         dpg.set_viewport_resize_callback(self.resize_windows)
 
-    def update_panels(self):
+    def update_panels(self, snapshot):
         # Update status text
         if self.is_running:
             dpg.set_value("StatusText", "Running")
@@ -157,8 +218,26 @@ class Window:
             dpg.configure_item("StatusText", color=(255, 0, 0))
         
         # Update time and frame text
-        dpg.set_value("TimeStatus", f"{self.simulation.t:.2f}s")
-        dpg.set_value("FrameStatus", self.simulation.frame_count)
+        dpg.set_value("TimeStatus", f"{snapshot.t:.2f}s")
+        dpg.set_value("FrameStatus", snapshot.frame_count)
+        if self.worker is not None:
+            dpg.set_value("RateStatus", f"{self.worker.measured_rate:.0f}" if self.is_running else "-")
+        else:
+            dpg.set_value("RateStatus", f"{self.speed * dpg.get_frame_rate():.0f}" if self.is_running else "-")
+
+        # Tempi per fase (vedi Simulation.enable_profiling), aggiornati ogni tanto per restare leggibili
+        self._panel_frames += 1
+        if self.simulation.profiler is not None and self._panel_frames >= PROFILE_REFRESH_FRAMES:
+            self._panel_frames = 0
+            dpg.set_value("ProfileText", "\n".join(format_report(self.simulation.profile_report(), limit=3)))
+
+    def toggle_profiling(self):
+        if dpg.get_value("ProfileCheckbox"):
+            self.simulation.enable_profiling()
+            self._panel_frames = PROFILE_REFRESH_FRAMES
+        else:
+            self.simulation.disable_profiling()
+            dpg.set_value("ProfileText", "")
 
     
     def mouse_down(self):
@@ -199,6 +278,19 @@ class Window:
 
     def set_speed(self):
         self.speed = dpg.get_value("SpeedInput")
+        if self.worker is not None:
+            self.worker.set_rate(self.speed * STEPS_PER_SPEED_UNIT)
+
+    def seek(self):
+        self.replay_index = dpg.get_value("ReplaySlider")
+
+    def next_frame(self):
+        if self.replay is not None:
+            self.replay_index = min(self.replay_index + 1, len(self.replay) - 1)
+        elif self.worker is not None:
+            self.worker.step()
+        else:
+            self.simulation.update()
 
 
     def to_screen(self, x, y):
@@ -277,104 +369,164 @@ class Window:
             )
 
     def draw_segments(self):
-        for segment in self.simulation.segments:
-            # 1. Colore strada
-            color = self.ROAD_COLORS.get(segment.category, (180, 180, 220))
-            
-            # Nota: thickness è in pixel, quindi qui *self.zoom va bene se vogliamo 
-            # che la strada sembri più larga quando zoomiamo (effetto realistico).
-            dpg.draw_polyline(segment.points, color=color, thickness=3.5*self.zoom, parent="Canvas")
-            
-            # 2. Freccia direzione
-            # Calcoliamo posizione e angolo a metà strada
-            mid_t = 0.5
-            p = segment.get_point(mid_t) 
-            h = segment.get_heading(mid_t) 
-            
-            arrow_node = dpg.add_draw_node(parent="Canvas")
-            
-            # CORREZIONE: Dimensione fissa in unità mondo (es. 2 metri)
-            # Rimuoviamo "* self.zoom" perché il nodo è già scalato.
-            size = 2.0  
-            
-            dpg.draw_arrow(
-                p1=(size, 0), 
-                p2=(-size, 0), 
-                thickness=0.5, # Spessore linea freccia
-                size=size,     # Dimensione punta
-                color=(50, 50, 50), 
-                parent=arrow_node
-            )
-            
-            # Applichiamo rotazione e traslazione locale
-            translate = dpg.create_translation_matrix(p)
-            rotate = dpg.create_rotation_matrix(h, [0, 0, 1])
-            dpg.apply_transform(arrow_node, translate * rotate)
-
-    def draw_vehicles(self):
-        for segment in self.simulation.segments:
-            for vehicle_id in segment.vehicles:
-                vehicle = self.simulation.vehicles[vehicle_id]
-                progress = vehicle.x / segment.get_length()
+        # Un nodo per cella della griglia: il culling mostra/nasconde celle intere
+        self._cell_nodes = {}
+        self._visible_cells = set()
+        self._view_key = None
+        for cell, indices in self.grid.cells.items():
+            cell_node = dpg.add_draw_node(parent="StaticLayer", show=False)
+            self._cell_nodes[cell] = cell_node
+            for index in indices:
+                self.draw_segment(self.simulation.segments[index], cell_node)
+
+    def draw_segment(self, segment, parent):
+        # 1. Colore strada
+        color = self.ROAD_COLORS.get(segment.category, (180, 180, 220))
+        
+        # Nota: thickness è in pixel, quindi qui *self.zoom va bene se vogliamo 
+        # che la strada sembri più larga quando zoomiamo (effetto realistico).
+        dpg.draw_polyline(segment.points, color=color, thickness=3.5*self.zoom, parent=parent)
 
-                position = segment.get_point(progress)
-                heading = segment.get_heading(progress)
+        # A zoom basso la freccia sarebbe più piccola di un pixel
+        if self.zoom < LOD_ZOOM:
+            return
+        
+        # 2. Freccia direzione
+        # Calcoliamo posizione e angolo a metà strada
+        mid_x = segment.get_length() / 2
+        p = segment.get_point_at(mid_x) 
+        h = segment.get_heading_at(mid_x) 
+        
+        arrow_node = dpg.add_draw_node(parent=parent)
+        
+        # CORREZIONE: Dimensione fissa in unità mondo (es. 2 metri)
+        # Rimuoviamo "* self.zoom" perché il nodo è già scalato.
+        size = 2.0  
+        
+        dpg.draw_arrow(
+            p1=(size, 0), 
+            p2=(-size, 0), 
+            thickness=0.5, # Spessore linea freccia
+            size=size,     # Dimensione punta
+            color=(50, 50, 50), 
+            parent=arrow_node
+        )
+        
+        # Applichiamo rotazione e traslazione locale
+        translate = dpg.create_translation_matrix(p)
+        rotate = dpg.create_rotation_matrix(h, [0, 0, 1])
+        dpg.apply_transform(arrow_node, translate * rotate)
+
+    def update_visibility(self):
+        """Celle e segmenti dentro la finestra: ricalcolati solo quando cambia la vista"""
+        key = (self.zoom, self.offset, self.canvas_width, self.canvas_height, id(self.grid))
+        if key == self._view_key:
+            return
+        self._view_key = key
+
+        x_min, y_min = self.to_world(0, 0)
+        x_max, y_max = self.to_world(self.canvas_width, self.canvas_height)
+        rect = (x_min, y_min, x_max, y_max)
+
+        visible = self.grid.visible_cells(rect)
+        for cell in visible - self._visible_cells:
+            dpg.configure_item(self._cell_nodes[cell], show=True)
+        for cell in self._visible_cells - visible:
+            dpg.configure_item(self._cell_nodes[cell], show=False)
+        self._visible_cells = visible
+        self.visible_segments = set(self.grid.query(rect))
+
+    def _show_pool(self, pool, name, used):
+        """Mostra i primi `used` nodi del pool e nasconde quelli non più usati"""
+        shown = self._shown[name]
+        for node, _ in pool[shown:used]:
+            dpg.configure_item(node, show=True)
+        for node, _ in pool[used:shown]:
+            dpg.configure_item(node, show=False)
+        self._shown[name] = used
+
+    def _vehicle_item(self, i):
+        if i == len(self.vehicle_pool):
+            node = dpg.add_draw_node(parent="VehicleLayer")
+            line = dpg.draw_line((0, 0), (1, 0), parent=node)
+            self.vehicle_pool.append((node, line))
+        return self.vehicle_pool[i]
+
+    def draw_density(self, snapshot):
+        """Livello di dettaglio ridotto: segmenti occupati e visibili colorati per densità"""
+        shown = set()
+        for segment_index, vehicles in snapshot.segments:
+            if segment_index not in self.visible_segments:
+                continue
+            segment = self.simulation.segments[segment_index]
+            if segment_index not in self.density_items:
+                self.density_items[segment_index] = dpg.draw_polyline(segment.points, parent="DensityLayer")
+            density = min(1.0, len(vehicles) * JAM_SPACING / max(segment.get_length(), 1e-6))
+            color = (int(255*density), int(255*(1 - density)), 0)
+            dpg.configure_item(self.density_items[segment_index], color=color, thickness=3.5*self.zoom, show=True)
+            shown.add(segment_index)
+        for segment_index in self._density_shown - shown:
+            dpg.configure_item(self.density_items[segment_index], show=False)
+        self._density_shown = shown
+
+    def draw_vehicles(self, snapshot):
+        count = 0
+        # Solo i segmenti occupati e visibili: la maggior parte delle strade è vuota o fuori schermo
+        for segment_index, vehicles in snapshot.segments:
+            if segment_index not in self.visible_segments:
+                continue
+            segment = self.simulation.segments[segment_index]
+            for x, length, width, vehicle_class in vehicles:
+                position = segment.get_point_at(x)
+                heading = segment.get_heading_at(x)
 
                 # Recupera il colore in base alla classe
-                color = self.VEHICLE_COLORS.get(vehicle.vehicle_class, (0, 0, 255))
+                color = self.VEHICLE_COLORS.get(vehicle_class, (0, 0, 255))
 
-                node = dpg.add_draw_node(parent="Canvas")
+                # Nodo riusato dal pool: aggiorniamo linea e trasformazione invece di ricrearli
+                node, line = self._vehicle_item(count)
+                count += 1
                 
-                # Disegna il veicolo
-                # Usiamo vehicle.l per la lunghezza e vehicle.w per lo spessore (thickness)
+                # Lunghezza e larghezza (thickness) del veicolo
                 # Nota: thickness in dpg è in pixel/unità schermo, lo scaliamo con lo zoom
-                # Se vehicle.w non è settato (vecchi test), usiamo un default
-                width = getattr(vehicle, 'w', 2) 
-
-                dpg.draw_line(
-                    (0, 0),
-                    (vehicle.l, 0),
+                dpg.configure_item(
+                    line,
+                    p2=(length, 0),
                     thickness=width * self.zoom * 0.8, # 0.8 è un fattore di scala visiva
-                    color=color,
-                    parent=node
+                    color=color
                 )
 
                 translate = dpg.create_translation_matrix(position)
                 rotate = dpg.create_rotation_matrix(heading, [0, 0, 1])
                 dpg.apply_transform(node, translate*rotate)
 
-    def draw_obstacles(self):
-        for obs in self.simulation.obstacles:
-            segment = self.simulation.segments[obs.segment_id]
-            
-            # Calcoliamo la posizione cartesiana lungo la curva
-            # obs.x è la distanza in metri, dobbiamo convertirla in progresso (0.0 - 1.0)
-            progress = obs.x / segment.get_length()
-            
-            # Se l'ostacolo è oltre la fine della strada (errore arrotondamento), limitiamolo
-            if progress > 1.0: progress = 1.0
-            if progress < 0.0: progress = 0.0
-
-            position = segment.get_point(progress)
-            heading = segment.get_heading(progress)
+        self._show_pool(self.vehicle_pool, "vehicles", count)
 
-            # Creiamo un nodo per ruotare l'ostacolo allineandolo alla strada
-            node = dpg.add_draw_node(parent="Canvas")
+    def draw_obstacles(self, snapshot):
+        for i, (segment_id, x, size, color) in enumerate(snapshot.obstacles):
+            segment = self.simulation.segments[segment_id]
             
-            # Disegniamo una "X" o un blocco
-            size = obs.width
-            color = obs.color
+            # Calcoliamo la posizione cartesiana lungo la curva
+            # x è la distanza in metri (get_point_at la limita alla lunghezza della strada)
+            position = segment.get_point_at(x)
+            heading = segment.get_heading_at(x)
+
+            # Nodo per ruotare l'ostacolo allineandolo alla strada (riusato dal pool)
+            if i == len(self.obstacle_pool):
+                node = dpg.add_draw_node(parent="ObstacleLayer")
+                body = dpg.draw_rectangle((0, 0), (1, 1), parent=node)
+                self.obstacle_pool.append((node, body))
+            node, body = self.obstacle_pool[i]
             
             # Corpo ostacolo
-            dpg.draw_rectangle(
-                (-size/2, -size/2), (size/2, size/2),
-                color=color, fill=color, parent=node
-            )
+            dpg.configure_item(body, pmin=(-size/2, -size/2), pmax=(size/2, size/2), color=color, fill=color)
             
             # Trasformazioni
             translate = dpg.create_translation_matrix(position)
             rotate = dpg.create_rotation_matrix(heading, [0, 0, 1])
             dpg.apply_transform(node, translate*rotate)
+
+        self._show_pool(self.obstacle_pool, "obstacles", len(snapshot.obstacles))
     
     def draw_static_objects(self):
         for obj in self.simulation.static_objects:
@@ -385,72 +537,51 @@ class Window:
                 # Calcoliamo i due angoli del rettangolo nel mondo
                 p1 = (obj.x - obj.width/2, obj.y - obj.height/2)
                 p2 = (obj.x + obj.width/2, obj.y + obj.height/2)
-                dpg.draw_rectangle(p1, p2, color=obj.color, fill=obj.color, parent="Canvas")
+                dpg.draw_rectangle(p1, p2, color=obj.color, fill=obj.color, parent="StaticLayer")
                 
             elif obj.shape == "circle":
                 # Centro e raggio nel mondo
                 center = (obj.x, obj.y)
                 radius = obj.width / 2 # Usiamo la larghezza come diametro
-                dpg.draw_circle(center, radius, color=obj.color, fill=obj.color, parent="Canvas")
+                dpg.draw_circle(center, radius, color=obj.color, fill=obj.color, parent="StaticLayer")
 
-    def draw_traffic_lights(self):
-        for tl in self.simulation.traffic_lights:
-            segment = self.simulation.segments[tl.segment_id]
-            
-            # 1. Calcolo posizione sulla curva
-            progress = tl.x / segment.get_length()
-            if progress > 1: progress = 1
-            if progress < 0: progress = 0
-            
-            position = segment.get_point(progress) # Centro della strada
-            heading = segment.get_heading(progress) # Direzione strada (radianti)
-
-            # --- DISEGNO STOP LINE ---
-            # Calcoliamo la perpendicolare per disegnare la linea di stop
-            # Larghezza linea (un po' più larga dell'auto, es. 4 metri)
-            line_width = 4.0 
-            
-            # Calcolo offset dx/dy per i due estremi della linea
-            # La perpendicolare è heading + 90 gradi (pi/2)
-            dx = (line_width / 2) * np.sin(heading)
-            dy = (line_width / 2) * np.cos(heading)
-            
-            # Punti della linea nel "Mondo"
-            # Nota: heading è l'angolo rispetto asse X. 
-            # Perpendicolare: (-sin, cos) o (sin, -cos)
-            
-            # Coordinate linea stop
-            p1_world = (position[0] - dx, position[1] + dy)
-            p2_world = (position[0] + dx, position[1] - dy)
-
-            # Disegniamo la linea di stop (Bianca se verde, Rossa se rosso per feedback visivo, o sempre Bianca)
-            # Facciamola sempre bianca per realismo, o gialla.
-            dpg.draw_line(p1_world, p2_world, color=(255, 255, 255), thickness=2*self.zoom, parent="Canvas")
-
-
-            # --- DISEGNO SEMAFORO (SFERA LATERALE) ---
-            node = dpg.add_draw_node(parent="Canvas")
-            
-            # Colore
-            color = (255, 0, 0) if tl.state == "red" else (0, 255, 0)
-            
-            # Trasformazioni per la sfera
-            translate = dpg.create_translation_matrix(position)
-            rotate = dpg.create_rotation_matrix(heading, [0, 0, 1])
-            dpg.apply_transform(node, translate * rotate)
-            
-            # Disegniamo la luce spostata a destra (es. y = -3.5 metri dal centro strada)
-            # Coordinate locali nel nodo ruotato: x=0 (sulla linea), y=-3.5 (a destra)
-            light_pos = (0, -3.5) 
-            radius = 6
-            
-            # Palo (linea nera dal centro strada al semaforo, opzionale, o solo cerchio)
-            # dpg.draw_line((0, -2), (0, -3.5), color=(0,0,0), thickness=1, parent=node)
-            
-            # Luce colorata
-            dpg.draw_circle(light_pos, radius, color=color, fill=color, parent=node)
-            # Bordo nero
-            dpg.draw_circle(light_pos, radius, color=(0,0,0), thickness=0.1*self.zoom, parent=node)
+    def _light_item(self, tl):
+        """Crea i disegni di un semaforo: la posizione non cambia, solo colore e spessori"""
+        segment = self.simulation.segments[tl.segment_id]
+        
+        # 1. Calcolo posizione sulla curva
+        position = segment.get_point_at(tl.x) # Centro della strada
+        heading = segment.get_heading_at(tl.x) # Direzione strada (radianti)
+
+        node = dpg.add_draw_node(parent="LightLayer")
+        translate = dpg.create_translation_matrix(position)
+        rotate = dpg.create_rotation_matrix(heading, [0, 0, 1])
+        dpg.apply_transform(node, translate * rotate)
+
+        # --- STOP LINE ---
+        # Perpendicolare alla strada nel nodo ruotato, larga 4 metri (un po' più dell'auto)
+        stop_line = dpg.draw_line((0, -2), (0, 2), color=(255, 255, 255), parent=node)
+
+        # --- SEMAFORO (SFERA LATERALE) ---
+        # Luce spostata a destra: coordinate locali x=0 (sulla linea), y=-3.5 (a destra)
+        light_pos = (0, -3.5) 
+        radius = 6
+        light = dpg.draw_circle(light_pos, radius, parent=node)
+        # Bordo nero
+        border = dpg.draw_circle(light_pos, radius, color=(0,0,0), parent=node)
+        return node, (stop_line, light, border)
+
+    def draw_traffic_lights(self, snapshot):
+        for i, state in enumerate(snapshot.lights):
+            if i == len(self.light_pool):
+                self.light_pool.append(self._light_item(self.simulation.traffic_lights[i]))
+            _, (stop_line, light, border) = self.light_pool[i]
+
+            # Solo colore e spessori cambiano da un frame all'altro
+            color = (255, 0, 0) if state == "red" else (0, 255, 0)
+            dpg.configure_item(light, color=color, fill=color)
+            dpg.configure_item(stop_line, thickness=2*self.zoom)
+            dpg.configure_item(border, thickness=0.1*self.zoom)
 
     def draw_stop_signs(self):
         for inter in self.simulation.intersections:
@@ -461,10 +592,10 @@ class Window:
                 
                 # Posizione: Fine strada
                 length = segment.get_length()
-                pos = segment.get_point(1.0) # Fine (t=1.0)
-                heading = segment.get_heading(1.0)
+                pos = segment.get_point_at(length)
+                heading = segment.get_heading_at(length)
                 
-                node = dpg.add_draw_node(parent="Canvas")
+                node = dpg.add_draw_node(parent="StaticLayer")
                 
                 translate = dpg.create_translation_matrix(pos)
                 rotate = dpg.create_rotation_matrix(heading, [0, 0, 1])
@@ -482,6 +613,39 @@ class Window:
                 # Testo S (semplificato, o solo simbolo rosso)
                 dpg.draw_text((center[0]-0.4, center[1]-0.4), "STOP", size=size*self.zoom, color=(255,255,255), parent=node)
 
+    def draw_overlay(self):
+        """Sfondo, assi e griglia (coordinate schermo): ridisegnati solo quando cambia la vista"""
+        key = (self.zoom, self.offset, self.canvas_width, self.canvas_height)
+        if key == self._overlay_key:
+            return
+        self._overlay_key = key
+        dpg.delete_item("OverlayCanvas", children_only=True)
+        self.draw_bg()
+        self.draw_axes()
+        self.draw_grid(unit=10)
+        self.draw_grid(unit=50)
+
+    def draw_static_layer(self):
+        """Strade, frecce, oggetti statici e STOP: ridisegnati solo se cambia la rete o lo zoom"""
+        sim = self.simulation
+        key = (sim.topology.version, len(sim.static_objects),
+               sum(len(inter.stop_signs) for inter in sim.intersections))
+        zoom_changed = self._static_zoom is None or abs(self.zoom/self._static_zoom - 1) > STATIC_ZOOM_TOLERANCE
+        if key == self._static_key and not zoom_changed:
+            return
+        if self.grid is None or key[0] != self._static_key[0]:
+            self.grid = SegmentGrid(sim.segments)
+            for item in self.density_items.values():
+                dpg.delete_item(item)
+            self.density_items = {}
+            self._density_shown = set()
+        self._static_key = key
+        self._static_zoom = self.zoom
+        dpg.delete_item("StaticLayer", children_only=True)
+        self.draw_segments()
+        self.draw_static_objects()
+        self.draw_stop_signs()
+
     def apply_transformation(self):
         screen_center = dpg.create_translation_matrix([self.canvas_width/2, self.canvas_height/2, -0.01])
         translate = dpg.create_translation_matrix(self.offset)
@@ -493,46 +657,69 @@ class Window:
         self.update_inertial_zoom()
         self.update_offset_zoom_slider()
 
-        # Remove old drawings
-        dpg.delete_item("OverlayCanvas", children_only=True)
-        dpg.delete_item("Canvas", children_only=True)
-        
-        # New drawings
-        self.draw_bg()
-        self.draw_axes()
-        self.draw_grid(unit=10)
-        self.draw_grid(unit=50)
-        self.draw_segments()
-        self.draw_static_objects()
-        self.draw_obstacles()
-        self.draw_traffic_lights()
-        self.draw_stop_signs() # <--- AGGIUNGI QUI
-        self.draw_vehicles()
+        # Contenuto statico: ridisegnato solo se cambia la vista o la rete
+        self.draw_overlay()
+        self.draw_static_layer()
+
+        self.update_visibility()
+
+        # Stato dinamico da disegnare: frame registrato, ultimo snapshot del worker oppure stato attuale
+        if self.replay is not None:
+            snapshot = self.replay.snapshot(self.replay_index)
+        elif self.worker is not None:
+            snapshot = self.worker.snapshot
+        else:
+            snapshot = take_snapshot(self.simulation)
+
+        # Contenuto dinamico: nodi riusati, aggiornati sul posto
+        self.draw_obstacles(snapshot)
+        self.draw_traffic_lights(snapshot)
+        if self.zoom < LOD_ZOOM:
+            # Vista d'insieme: densità per segmento invece dei singoli veicoli
+            self._show_pool(self.vehicle_pool, "vehicles", 0)
+            self.draw_density(snapshot)
+        else:
+            for segment_index in self._density_shown:
+                dpg.configure_item(self.density_items[segment_index], show=False)
+            self._density_shown = set()
+            self.draw_vehicles(snapshot)
 
         # Apply transformations
         self.apply_transformation()
 
         # Update panels
-        self.update_panels()
-
-        # Update simulation
-        if self.is_running:
+        self.update_panels(snapshot)
+
+        # Update simulation (in modalità threaded avanza da sola nel worker)
+        if self.replay is not None:
+            if self.is_running:
+                self.replay_index = min(self.replay_index + self.speed, len(self.replay) - 1)
+            dpg.set_value("ReplaySlider", self.replay_index)
+        elif self.is_running and self.worker is None:
             self.simulation.run(self.speed)
 
     def show(self):
         dpg.show_viewport()
+        if self.worker is not None:
+            self.worker.start()
         while dpg.is_dearpygui_running():
             self.render_loop()
             dpg.render_dearpygui_frame()
+        if self.worker is not None:
+            self.worker.close()
         dpg.destroy_context()
 
     def run(self):
         self.is_running = True
+        if self.worker is not None:
+            self.worker.resume()
         dpg.set_item_label("RunStopButton", "Stop")
         dpg.bind_item_theme("RunStopButton", "StopButtonTheme")
 
     def stop(self):
         self.is_running = False
+        if self.worker is not None:
+            self.worker.pause()
         dpg.set_item_label("RunStopButton", "Run")
         dpg.bind_item_theme("RunStopButton", "RunButtonTheme")
 
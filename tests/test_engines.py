@@ -0,0 +1,30 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from trafficSimulator.core.config_loader import ConfigLoader
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def trajectory(config, engine, steps):
+    np.random.seed(0)
+    sim = ConfigLoader(engine=engine).create_simulation_from_config(config)
+    # Un semaforo sul primo segmento: code, frenate e ripartenze
+    sim.create_traffic_light(0, sim.segments[0].get_length() - 5, cycle_time=7)
+    states = []
+    for _ in range(steps):
+        sim.update()
+        states.append(sorted((vid, veh.x, veh.v, veh.a) for vid, veh in sim.vehicles.items()))
+    return states
+
+
+@pytest.mark.parametrize("name", ["my_config.json", "test_navigation.json"])
+def test_vectorized_engine_matches_scalar(name):
+    config = json.loads((EXAMPLES / name).read_text())
+    scalar = trajectory(config, "scalar", 3000)
+    vectorized = trajectory(config, "vectorized", 3000)
+    assert scalar[-1]
+    assert vectorized == scalar
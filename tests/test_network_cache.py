@@ -0,0 +1,56 @@
+import copy
+import json
+from pathlib import Path
+
+import numpy as np
+
+from trafficSimulator.core.config_loader import ConfigLoader
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def navigation_config():
+    config = json.loads((EXAMPLES / "test_navigation.json").read_text())
+    config = copy.deepcopy(config)
+    # Una curva, per coprire anche le tabelle di lunghezza d'arco non banali
+    config["segments"].append({"id": "curve", "type": "quadratic", "start": [160, 0],
+                               "control": [200, 0], "end": [200, 40]})
+    return config
+
+
+def vehicle_state(sim):
+    return sorted((vid, veh.x, veh.v, veh.a, veh.current_road_index, tuple(veh.path))
+                  for vid, veh in sim.vehicles.items())
+
+
+def test_compiled_network_matches_fresh_build(tmp_path):
+    config = navigation_config()
+    loader = ConfigLoader()
+    path = str(tmp_path / "network.npz")
+    loader.compile(config, path)
+
+    fresh = loader.build_network(config)
+    compiled, routes = loader.load_compiled(config, path)
+
+    assert len(compiled.segments) == len(fresh.segments)
+    for a, b in zip(compiled.segments, fresh.segments):
+        assert a.id_segment == b.id_segment
+        assert [tuple(p) for p in a.points] == [tuple(p) for p in b.points]
+        assert list(a.cumulative_length) == list(b.cumulative_length)
+        assert list(a.headings) == list(b.headings)
+        assert a.get_length() == b.get_length()
+    assert {i: sorted(s) for i, s in compiled.topology.successors.items() if s} == \
+        {i: sorted(s) for i, s in fresh.topology.successors.items() if s}
+    assert routes == loader.resolve_routes(fresh, config)
+
+
+def test_cached_simulation_runs_like_fresh_one(tmp_path):
+    config = navigation_config()
+    results = []
+    for cache_dir in (None, str(tmp_path), str(tmp_path)):  # senza cache, compilazione, file in cache
+        np.random.seed(3)
+        sim = ConfigLoader(cache_dir=cache_dir).create_simulation_from_config(config)
+        sim.run(1200)
+        results.append(vehicle_state(sim))
+    assert results[0]
+    assert results[0] == results[1] == results[2]
@@ -0,0 +1,27 @@
+import json
+from pathlib import Path
+
+from trafficSimulator import sweep
+from trafficSimulator.core import routing
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def test_sweep_builds_routing_graph_once(monkeypatch):
+    builds = []
+    original = routing.RoutingGraph.__init__
+
+    def counting_init(self, *args, **kwargs):
+        builds.append(1)
+        original(self, *args, **kwargs)
+
+    monkeypatch.setattr(routing.RoutingGraph, "__init__", counting_init)
+    monkeypatch.setattr(sweep, "_TEMPLATES", {})
+    config = json.loads((EXAMPLES / "test_navigation.json").read_text())
+
+    rows = sweep.run_sweep(config, {"vehicle_generators.0.vehicle_rate": [5, 10, 20]},
+                           steps=600, seeds=[0, 1], max_workers=1)
+
+    assert len(rows) == 6
+    assert sum(row["vehicles_spawned"] for row in rows) > 0
+    assert len(builds) == 1